@@ -0,0 +1,81 @@
+import os
+
+import tablib
+
+from django.conf import settings
+from django.utils import timezone
+
+from subscription_manager.subscription.admin import ActiveSubscriptionResource
+
+from .models import ExportJob
+
+
+def run_export_job(job, chunk_size=2000, progress_interval=1000):
+    """
+    Renders the export of a claimed job into a file in the export
+    directory. The progress is stored every few rows, such that it can
+    be displayed while waiting. The file is written to a temporary path
+    first and moved afterwards, so that partial files are never served.
+    """
+    try:
+        resource = ActiveSubscriptionResource()
+        total = resource.get_queryset().count()
+        dataset = tablib.Dataset(headers=resource.get_export_headers())
+        for row in resource.iter_rows(chunk_size=chunk_size):
+            dataset.append(row)
+            if len(dataset) % progress_interval == 0:
+                # Leave the last percent for writing the file
+                progress = min(99 * len(dataset) // max(total, 1), 99)
+                ExportJob.objects.filter(pk=job.pk).update(progress=progress)
+
+        content = getattr(dataset, job.format)
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+
+        os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+        file_name = '{}-{}.{}'.format(job.pk, job.data_version, job.format)
+        path = os.path.join(settings.EXPORT_ROOT, file_name)
+        with open(path + '.tmp', 'wb') as file:
+            file.write(content)
+        os.replace(path + '.tmp', path)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = repr(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        raise
+
+    job.status = 'done'
+    job.progress = 100
+    job.row_count = len(dataset)
+    job.file_name = file_name
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'row_count', 'file_name', 'finished_at'])
+    return job
+
+
+def prune_export_jobs():
+    """
+    Marks jobs as failed which no worker claimed or finished in time and
+    deletes jobs and files which are older than the retention period.
+    Returns the number of deleted jobs.
+    """
+    ExportJob.objects.abandoned(settings.EXPORT_JOB_TIMEOUT).update(
+        status='failed',
+        error='Timeout',
+        finished_at=timezone.now()
+    )
+    ExportJob.objects.stale(settings.EXPORT_JOB_TIMEOUT).update(
+        status='failed',
+        error='Nicht bearbeitet',
+        finished_at=timezone.now()
+    )
+
+    expired_jobs = ExportJob.objects.expired(settings.EXPORT_RETENTION)
+    for job in expired_jobs.exclude(file_name=''):
+        try:
+            os.remove(job.path())
+        except FileNotFoundError:
+            pass
+    count, _ = expired_jobs.delete()
+    return count
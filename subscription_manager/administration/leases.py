@@ -0,0 +1,130 @@
+import hashlib
+import os
+import socket
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from django.utils import timezone
+from django_cron.backends.lock.base import DjangoCronJobLock
+
+from .models import JobLease
+
+
+class Lease:
+    """
+    Lease on a named resource which is held by at most one process of all
+    nodes at a time. On PostgreSQL, a session level advisory lock is taken,
+    which the database releases if the process dies. On other databases,
+    the lease is stored in the JobLease table with a conditional update,
+    which locks the row. Such leases expire after their duration, unless
+    they are renewed, and can then be taken over by another process.
+    """
+    def __init__(self, name, duration=None):
+        self.name = name
+        self.duration = duration or settings.JOB_LEASE_DURATION
+        self.owner = '{}:{}:{}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self.advisory = settings.JOB_LEASE_ADVISORY_LOCKS and connection.vendor == 'postgresql'
+        self.acquired = False
+        self.renewal = None
+        self.stop_renewal = threading.Event()
+
+    def __enter__(self):
+        return self.acquire(keep_alive=True)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def key(self):
+        """
+        Returns the advisory lock's key, a signed 64 bit integer derived from the name.
+        """
+        return int.from_bytes(hashlib.sha256(self.name.encode()).digest()[:8], 'big', signed=True)
+
+    def acquire(self, keep_alive=False):
+        """
+        Tries to acquire the lease without waiting. Returns true if it has
+        been acquired. If keep_alive is true, the lease is renewed in the
+        background until it is released.
+        """
+        if self.advisory:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [self.key()])
+                self.acquired = cursor.fetchone()[0]
+            return self.acquired
+
+        # Make sure the row exists, then take it over if it has expired
+        now = timezone.now()
+        JobLease.objects.bulk_create([JobLease(name=self.name, expires_at=now)], ignore_conflicts=True)
+        self.acquired = JobLease.objects.filter(
+            Q(expires_at__lte=now) | Q(owner=self.owner),
+            name=self.name
+        ).update(owner=self.owner, acquired_at=now, expires_at=now + self.duration) > 0
+
+        if self.acquired and keep_alive:
+            self.stop_renewal.clear()
+            self.renewal = threading.Thread(target=self.keep_alive, daemon=True)
+            self.renewal.start()
+        return self.acquired
+
+    def renew(self):
+        """
+        Extends the lease by its duration. Returns false if it has expired
+        and has been taken over by another process in the meantime.
+        """
+        if self.advisory:
+            return self.acquired
+        self.acquired = JobLease.objects.filter(name=self.name, owner=self.owner).update(
+            expires_at=timezone.now() + self.duration
+        ) > 0
+        return self.acquired
+
+    def keep_alive(self):
+        """
+        Renews the lease three times per duration until it is released.
+        Runs in its own thread, which has its own database connection.
+        """
+        try:
+            while not self.stop_renewal.wait(self.duration.total_seconds() / 3):
+                if not self.renew():
+                    break
+        finally:
+            connections.close_all()
+
+    def release(self):
+        """
+        Releases the lease, such that other processes can acquire it immediately.
+        """
+        if self.renewal is not None:
+            self.stop_renewal.set()
+            self.renewal.join()
+            self.renewal = None
+        if not self.acquired:
+            return
+
+        if self.advisory:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [self.key()])
+        else:
+            JobLease.objects.filter(name=self.name, owner=self.owner).update(owner='', expires_at=timezone.now())
+        self.acquired = False
+
+
+class LeaseLock(DjangoCronJobLock):
+    """
+    Lock backend of django_cron, which holds a lease on a cron job while
+    it runs, such that it only runs on one node at a time. Jobs which
+    allow parallel runs, e.g. because they split their work into shards,
+    are not locked.
+    """
+    def __init__(self, cron_class, *args, **kwargs):
+        super().__init__(cron_class, *args, **kwargs)
+        self.lease = Lease('cron:{}'.format(self.job_code))
+
+    def lock(self):
+        return self.lease.acquire(keep_alive=True)
+
+    def release(self):
+        self.lease.release()
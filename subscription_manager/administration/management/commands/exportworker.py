@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from subscription_manager.administration.exports import prune_export_jobs, run_export_job
+from subscription_manager.administration.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Renders requested exports into files and prunes old ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Render all pending exports and exit instead of waiting for new ones.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Seconds to wait between checks for new exports.'
+        )
+        parser.add_argument(
+            '--prune-interval',
+            type=float,
+            default=60*60,
+            help='Seconds between removals of old exports.'
+        )
+
+    def handle(self, *args, **options):
+        last_pruned = None
+        while True:
+            close_old_connections()
+
+            if last_pruned is None or time.monotonic() - last_pruned >= options['prune_interval']:
+                count = prune_export_jobs()
+                if count:
+                    self.stdout.write('Removed {} old exports.'.format(count))
+                last_pruned = time.monotonic()
+
+            job = ExportJob.objects.claim()
+            if job is not None:
+                try:
+                    run_export_job(job)
+                except Exception as e:
+                    self.stderr.write('Export #{} failed: {!r}'.format(job.pk, e))
+                else:
+                    self.stdout.write(self.style.SUCCESS('Rendered export #{} ({} rows).'.format(job.pk, job.row_count)))
+                continue
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
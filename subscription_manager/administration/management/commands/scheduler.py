@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from subscription_manager.administration.models import JobRun
+from subscription_manager.administration.scheduler import get_cron_classes, get_owner, get_timeout, run_cron_job
+
+
+class Command(BaseCommand):
+    help = 'Runs the cron jobs of CRON_CLASSES according to their schedules within a single process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run all due jobs, wait for them and exit.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60,
+            help='Seconds to wait between checks for due jobs, which has to be shorter than JOB_LEASE_DURATION.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of jobs which can run at the same time (default: all of them).'
+        )
+
+    def handle(self, *args, **options):
+        cron_classes = get_cron_classes()
+        owner = get_owner()
+
+        # Each job runs in its own thread, a job is not started again while it is running
+        running = dict()
+        with ThreadPoolExecutor(max_workers=options['workers'] or len(cron_classes)) as executor:
+            while True:
+                close_old_connections()
+                JobRun.objects.renew(owner)
+                self.fail_abandoned()
+
+                for cron_class in cron_classes:
+                    future = running.get(cron_class.code)
+                    if future is not None:
+                        if not future.done():
+                            # Threads cannot be stopped, but the run is marked and reported
+                            if JobRun.objects.time_out(cron_class.code, get_timeout(cron_class), owner):
+                                self.stderr.write('Job {} timed out.'.format(cron_class.code))
+                            continue
+                        self.report(cron_class.code, future)
+
+                    running[cron_class.code] = executor.submit(run_cron_job, cron_class)
+
+                if options['once']:
+                    while wait(running.values(), timeout=options['interval']).not_done:
+                        JobRun.objects.renew(owner)
+                    for code, future in running.items():
+                        self.report(code, future)
+                    return
+                time.sleep(options['interval'])
+
+    def fail_abandoned(self):
+        """
+        Marks runs whose lease has expired as failed, as their scheduler
+        process, on this or another node, has been stopped.
+        """
+        count = JobRun.objects.abandoned().update(status='failed', message='Der Scheduler wurde während des Laufs beendet.')
+        if count:
+            self.stderr.write('Marked {} abandoned runs as failed.'.format(count))
+
+    def report(self, code, future):
+        """
+        Writes the result of a finished job to the output.
+        """
+        if future.exception() is not None:
+            self.stderr.write('Job {} failed: {!r}'.format(code, future.exception()))
+            return
+
+        run = future.result()
+        if run is None:
+            return
+        if run.status == 'failed':
+            self.stderr.write('Job {} failed after {}: {}'.format(code, run.duration(), run.message.strip().splitlines()[-1]))
+        else:
+            self.stdout.write(self.style.SUCCESS('Ran job {} in {} ({} rows).'.format(code, run.duration(), run.rows)))
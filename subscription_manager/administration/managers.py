@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class ExportJobManager(models.Manager):
+    def request(self, format, data_version, user=None):
+        """
+        Returns a job that exports the given data version in the given
+        format. A pending, running or finished job of the same data version
+        and day is reused, such that unchanged data is only rendered once.
+        Jobs of previous days are not reused, as subscriptions become active
+        or inactive from one day to the next and the file is named by date.
+        """
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        job = self.filter(
+            format=format,
+            data_version=data_version,
+            status__in=['pending', 'running', 'done'],
+            created_at__gte=today
+        ).exclude(pk__in=self.stale(settings.EXPORT_JOB_TIMEOUT)).order_by('-created_at').first()
+        if job is not None:
+            return job
+
+        return self.create(format=format, data_version=data_version, requested_by=user)
+
+    def claim(self):
+        """
+        Marks the oldest pending job as running and returns it. Rows locked
+        by other workers are skipped. Returns None if no job is pending.
+        """
+        with transaction.atomic():
+            job = self.select_for_update(skip_locked=True).filter(status='pending').order_by('created_at').first()
+            if job is None:
+                return None
+            job.status = 'running'
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'started_at'])
+        return job
+
+    def abandoned(self, timeout):
+        """
+        Returns running jobs that have been started before the
+        timeout, e.g. because their worker has been killed.
+        """
+        return self.filter(status='running', started_at__lt=timezone.now() - timeout)
+
+    def stale(self, timeout):
+        """
+        Returns pending jobs that have been requested before the timeout,
+        but have not been claimed by a worker, e.g. because none is running.
+        """
+        return self.filter(status='pending', created_at__lt=timezone.now() - timeout)
+
+    def expired(self, retention):
+        """
+        Returns finished or failed jobs which are older than the retention period.
+        """
+        return self.filter(status__in=['done', 'failed'], created_at__lt=timezone.now() - retention)
+
+
+class JobRunManager(models.Manager):
+    def latest_per_code(self):
+        """
+        Returns the latest run of each job.
+        """
+        latest = self.values('code').annotate(latest_pk=models.Max('pk')).values('latest_pk')
+        return self.filter(pk__in=latest).order_by('code')
+
+    def time_out(self, code, timeout, owner):
+        """
+        Marks the running runs of a job by the given owner which started
+        before the timeout as timed out. Returns the number of marked runs.
+        """
+        return self.filter(
+            code=code,
+            owner=owner,
+            status='running',
+            started_at__lt=timezone.now() - timeout
+        ).update(status='timed_out')
+
+    def renew(self, owner):
+        """
+        Extends the leases of the owner's running runs.
+        """
+        return self.filter(owner=owner, status='running').update(expires_at=timezone.now() + settings.JOB_LEASE_DURATION)
+
+    def abandoned(self):
+        """
+        Selects runs which are still marked as running, but whose lease
+        has expired, e.g. after their scheduler has been stopped during a
+        run. Runs of schedulers on other nodes are renewed and not selected.
+        """
+        return self.filter(models.Q(expires_at__lt=timezone.now()) | models.Q(expires_at=None), status='running')
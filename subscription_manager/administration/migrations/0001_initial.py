@@ -0,0 +1,43 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('csv', 'Komma getrennte Werte (.csv)'), ('ods', 'Open Document Sheet (.ods)'), ('xlsx', 'Excel-Datei (.xlsx)')], max_length=10, verbose_name='Format')),
+                ('data_version', models.BigIntegerField(verbose_name='Datenversion')),
+                ('status', models.CharField(choices=[('pending', 'Ausstehend'), ('running', 'In Bearbeitung'), ('done', 'Fertig'), ('failed', 'Fehlgeschlagen')], db_index=True, default='pending', max_length=10, verbose_name='Status')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Fortschritt in Prozent')),
+                ('row_count', models.PositiveIntegerField(blank=True, null=True, verbose_name='Anzahl Zeilen')),
+                ('file_name', models.CharField(blank=True, max_length=100, verbose_name='Dateiname')),
+                ('error', models.TextField(blank=True, verbose_name='Fehler')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Erstellt am')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Gestartet am')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Beendet am')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Angefordert von')),
+            ],
+            options={
+                'verbose_name': 'Exportauftrag',
+                'verbose_name_plural': 'Exportaufträge',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='exportjob',
+            index=models.Index(fields=['format', 'data_version'], name='administrat_format_ffd462_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administration', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=64, verbose_name='Job')),
+                ('status', models.CharField(choices=[('running', 'Läuft'), ('succeeded', 'Erfolgreich'), ('failed', 'Fehlgeschlagen'), ('timed_out', 'Zeitüberschreitung')], default='running', max_length=10, verbose_name='Status')),
+                ('rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='Verarbeitete Zeilen')),
+                ('message', models.TextField(blank=True, verbose_name='Meldung')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Gestartet am')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Beendet am')),
+            ],
+            options={
+                'verbose_name': 'Joblauf',
+                'verbose_name_plural': 'Jobläufe',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='jobrun',
+            index=models.Index(fields=['code', 'started_at'], name='administrat_code_1c8559_idx'),
+        ),
+    ]
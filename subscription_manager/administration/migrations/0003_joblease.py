@@ -0,0 +1,26 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administration', '0002_jobrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobLease',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Name')),
+                ('owner', models.CharField(blank=True, max_length=100, verbose_name='Inhaber')),
+                ('acquired_at', models.DateTimeField(blank=True, null=True, verbose_name='Erhalten am')),
+                ('expires_at', models.DateTimeField(verbose_name='Läuft ab am')),
+            ],
+            options={
+                'verbose_name': 'Joblease',
+                'verbose_name_plural': 'Jobleases',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.1 on 2026-10-17 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administration', '0003_joblease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobrun',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Läuft ab am'),
+        ),
+        migrations.AddField(
+            model_name='jobrun',
+            name='owner',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Inhaber'),
+        ),
+    ]
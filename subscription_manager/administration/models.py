@@ -0,0 +1,242 @@
+import os
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .managers import ExportJobManager, JobRunManager
+
+
+class ExportJob(models.Model):
+    """
+    Export of the active subscriptions' addresses which is rendered
+    into a file by a background worker. Files are reused as long as
+    the data version, from which they were rendered, is current.
+    """
+    format = models.CharField(
+        max_length=10,
+        choices=(
+            ('csv', 'Komma getrennte Werte (.csv)'),
+            ('ods', 'Open Document Sheet (.ods)'),
+            ('xlsx', 'Excel-Datei (.xlsx)')
+        ),
+        verbose_name='Format'
+    )
+    data_version = models.BigIntegerField(
+        verbose_name='Datenversion'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=(
+            ('pending', 'Ausstehend'),
+            ('running', 'In Bearbeitung'),
+            ('done', 'Fertig'),
+            ('failed', 'Fehlgeschlagen')
+        ),
+        default='pending',
+        db_index=True,
+        verbose_name='Status'
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Fortschritt in Prozent'
+    )
+    row_count = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Anzahl Zeilen'
+    )
+    file_name = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Dateiname'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Fehler'
+    )
+    requested_by = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Angefordert von'
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Erstellt am'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Gestartet am'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Beendet am'
+    )
+
+    objects = ExportJobManager()
+
+    class Meta:
+        verbose_name = 'Exportauftrag'
+        verbose_name_plural = 'Exportaufträge'
+        indexes = [
+            models.Index(fields=['format', 'data_version'])
+        ]
+
+    def __str__(self):
+        return 'Export #{} ({}, {})'.format(self.pk, self.format, self.get_status_display())
+
+    def is_done(self):
+        """
+        Returns true if the file has been rendered.
+        """
+        return self.status == 'done'
+    is_done.boolean = True
+
+    def path(self):
+        """
+        Returns the absolute path of the rendered file.
+        """
+        return os.path.join(settings.EXPORT_ROOT, self.file_name)
+
+    def content_type(self):
+        """
+        Return the format's corresponding content type.
+        """
+        if self.format == 'csv':
+            return 'text/csv'
+        elif self.format == 'ods':
+            return 'application/vnd.oasis.opendocument.spreadsheet'
+        elif self.format == 'xlsx':
+            return 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return ''
+
+    def download_name(self):
+        """
+        Returns the file name under which the file is downloaded.
+        """
+        return '{}-active-subscriptions.{}'.format(
+            timezone.localtime(self.created_at).strftime('%Y-%m-%d'),
+            self.format
+        )
+
+
+class JobRun(models.Model):
+    """
+    Run of a cron job by the scheduler. Runs are recorded with their
+    duration and the number of processed rows, such that they can be
+    monitored on the administration page. The scheduler process running
+    the job renews the run's lease until it has finished, such that runs
+    of stopped processes can be recognised on all nodes.
+    """
+    code = models.CharField(
+        max_length=64,
+        verbose_name='Job'
+    )
+    owner = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Inhaber'
+    )
+    expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Läuft ab am'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=(
+            ('running', 'Läuft'),
+            ('succeeded', 'Erfolgreich'),
+            ('failed', 'Fehlgeschlagen'),
+            ('timed_out', 'Zeitüberschreitung')
+        ),
+        default='running',
+        verbose_name='Status'
+    )
+    rows = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Verarbeitete Zeilen'
+    )
+    message = models.TextField(
+        blank=True,
+        verbose_name='Meldung'
+    )
+    started_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Gestartet am'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Beendet am'
+    )
+
+    objects = JobRunManager()
+
+    class Meta:
+        verbose_name = 'Joblauf'
+        verbose_name_plural = 'Jobläufe'
+        indexes = [
+            models.Index(fields=['code', 'started_at'])
+        ]
+
+    def __str__(self):
+        return '{} ({})'.format(self.code, self.get_status_display())
+
+    def duration(self):
+        """
+        Returns the duration of the run, or None if it has not finished yet.
+        """
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def finish(self, status, rows=None, message=''):
+        """
+        Stores the result of the run. A run which has been marked as
+        timed out keeps its status.
+        """
+        self.finished_at = timezone.now()
+        self.rows = rows
+        self.message = message
+        JobRun.objects.filter(pk=self.pk).update(finished_at=self.finished_at, rows=rows, message=message)
+        if JobRun.objects.filter(pk=self.pk, status='running').update(status=status):
+            self.status = status
+
+
+class JobLease(models.Model):
+    """
+    Lease on a named resource, e.g. a cron job or one of its shards,
+    which is held by one process at a time across all nodes. A lease
+    can be taken over by another process once it has expired.
+    """
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Name'
+    )
+    owner = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Inhaber'
+    )
+    acquired_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Erhalten am'
+    )
+    expires_at = models.DateTimeField(
+        verbose_name='Läuft ab am'
+    )
+
+    class Meta:
+        verbose_name = 'Joblease'
+        verbose_name_plural = 'Jobleases'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,83 @@
+import logging
+import os
+import socket
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django_cron import CronJobManager, get_class
+
+from .models import JobRun
+
+logger = logging.getLogger(__name__)
+
+
+def get_cron_classes():
+    """
+    Returns the cron job classes listed in the CRON_CLASSES setting.
+    """
+    return [get_class(name) for name in settings.CRON_CLASSES]
+
+
+def get_owner():
+    """
+    Returns the owner of the runs started by this process.
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def get_timeout(cron_class):
+    """
+    Returns the time after which a run of the cron job counts as timed out.
+    """
+    return getattr(cron_class, 'timeout', None) or settings.SCHEDULER_JOB_TIMEOUT
+
+
+def run_cron_job(cron_class, force=False):
+    """
+    Runs a cron job if it is due according to its schedule, in the same way
+    as django_cron's runcrons command: the job is locked with the configured
+    lock backend and logged in the cron job log, from which the schedule is
+    evaluated. In addition, the run is recorded as JobRun with the number of
+    rows processed by the job. Returns the run, which has failed if the job
+    raised an exception, or None if the job was not due.
+    Called from the scheduler's threads, hence database connections are
+    closed afterwards.
+    """
+    manager = CronJobManager(cron_class, silent=True)
+    run = None
+    try:
+        # Most checks find that the job is not due, which does not require a lock
+        manager.cron_job = cron_class()
+        if not manager.should_run_now(force):
+            return None
+
+        with manager.lock_class(cron_class, True):
+            # The cron job manager logs and suppresses exceptions raised within it,
+            # hence failures of the job are recorded here and returned afterwards
+            with manager:
+                # The job might have been run by another process in the meantime
+                if not manager.should_run_now(force):
+                    return None
+
+                run = JobRun.objects.create(
+                    code=cron_class.code,
+                    owner=get_owner(),
+                    expires_at=timezone.now() + settings.JOB_LEASE_DURATION
+                )
+                try:
+                    manager.msg = manager.cron_job.do()
+                except Exception:
+                    logger.exception('Job %s failed.', cron_class.code)
+                    run.finish('failed', message=traceback.format_exc())
+                    manager.make_log(run.message, success=False)
+                else:
+                    manager.make_log(manager.msg, success=True)
+                    run.finish('succeeded', rows=getattr(manager.cron_job, 'rows', None), message=manager.msg)
+                    logger.info('Job %s finished after %s.', cron_class.code, run.duration())
+        return run
+    except manager.lock_class.LockFailedException:
+        return None
+    finally:
+        close_old_connections()
@@ -0,0 +1,190 @@
+import datetime
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_cron import Schedule
+from django_cron.models import CronJobLog
+
+from subscription_manager.cron import CronJob
+from subscription_manager.subscription.models import Plan
+from subscription_manager.subscription.tests import create_subscription
+from subscription_manager.user.models import User
+
+from .exports import prune_export_jobs, run_export_job
+from .leases import Lease, LeaseLock
+from .models import ExportJob, JobLease, JobRun
+from .scheduler import get_owner, run_cron_job
+
+
+class FailingJob(CronJob):
+    schedule = Schedule(run_every_mins=0)
+    code = 'tests.failing_job'
+
+    def run(self):
+        raise ValueError('Fehler')
+
+
+@mock.patch('subscription_manager.administration.scheduler.close_old_connections')
+class RunCronJobTests(TestCase):
+    """
+    Runs cron jobs like the scheduler does.
+    """
+    def test_failure_is_recorded(self, close_old_connections):
+        run = run_cron_job(FailingJob)
+        self.assertEqual(run.status, 'failed')
+        self.assertIn('ValueError: Fehler', run.message)
+        self.assertEqual(JobRun.objects.get().status, 'failed')
+        self.assertFalse(CronJobLog.objects.get(code=FailingJob.code).is_success)
+
+    def test_run_is_owned(self, close_old_connections):
+        run = run_cron_job(FailingJob)
+        self.assertEqual(run.owner, get_owner())
+        self.assertGreater(run.expires_at, timezone.now())
+
+
+class JobRunManagerTests(TestCase):
+    """
+    Runs of other scheduler processes are only touched once their lease
+    has expired.
+    """
+    def setUp(self):
+        now = timezone.now()
+        self.own = JobRun.objects.create(code='job', owner='node-1:1', expires_at=now + settings.JOB_LEASE_DURATION)
+        self.other = JobRun.objects.create(code='job', owner='node-2:1', expires_at=now + settings.JOB_LEASE_DURATION)
+        self.expired = JobRun.objects.create(code='job', owner='node-3:1', expires_at=now - timezone.timedelta(seconds=1))
+
+    def test_abandoned(self):
+        self.assertEqual(list(JobRun.objects.abandoned()), [self.expired])
+
+    def test_renew(self):
+        later = timezone.now() + settings.JOB_LEASE_DURATION
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            JobRun.objects.renew('node-1:1')
+            self.assertEqual(set(JobRun.objects.abandoned()), {self.other, self.expired})
+
+    def test_time_out(self):
+        self.assertEqual(JobRun.objects.time_out('job', timezone.timedelta(0), 'node-1:1'), 1)
+        self.assertEqual(
+            dict(JobRun.objects.values_list('owner', 'status')),
+            {'node-1:1': 'timed_out', 'node-2:1': 'running', 'node-3:1': 'running'}
+        )
+
+
+@mock.patch('django.conf.settings.JOB_LEASE_ADVISORY_LOCKS', False)
+class LeaseTests(TestCase):
+    """
+    Leases in the lease table, as used on all databases but PostgreSQL.
+    """
+    def test_exclusion(self):
+        first, second = Lease('tests'), Lease('tests')
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        # The holder can acquire its lease again
+        self.assertTrue(first.acquire())
+        self.assertTrue(Lease('other').acquire())
+
+    def test_release(self):
+        first, second = Lease('tests'), Lease('tests')
+        first.acquire()
+        first.release()
+        self.assertTrue(second.acquire())
+        self.assertEqual(JobLease.objects.get().owner, second.owner)
+
+    def test_takeover_after_expiry(self):
+        first, second = Lease('tests'), Lease('tests')
+        first.acquire()
+        later = timezone.now() + settings.JOB_LEASE_DURATION
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertTrue(second.acquire())
+            # The previous holder notices that its lease has been taken over
+            self.assertFalse(first.renew())
+        # Releasing a lost lease does not release the new holder's lease
+        first.release()
+        self.assertEqual(JobLease.objects.get().owner, second.owner)
+
+    def test_renewal_extends_lease(self):
+        first, second = Lease('tests'), Lease('tests')
+        first.acquire()
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + settings.JOB_LEASE_DURATION / 2):
+            self.assertTrue(first.renew())
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + settings.JOB_LEASE_DURATION):
+            self.assertFalse(second.acquire())
+
+    def test_cron_lock(self):
+        first, second = LeaseLock(FailingJob, silent=True), LeaseLock(FailingJob, silent=True)
+        self.assertTrue(first.lock())
+        self.assertFalse(second.lock())
+        first.release()
+        self.assertTrue(second.lock())
+        second.release()
+
+
+class ExportJobTests(TestCase):
+    """
+    Requests exports, claims them like the export worker and prunes old ones.
+    """
+    def setUp(self):
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        settings_override = override_settings(EXPORT_ROOT=export_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_request_reuses_jobs(self):
+        job = ExportJob.objects.request('csv', 1)
+        self.assertEqual(ExportJob.objects.request('csv', 1), job)
+        self.assertNotEqual(ExportJob.objects.request('xlsx', 1), job)
+        self.assertNotEqual(ExportJob.objects.request('csv', 2), job)
+
+        # Failed jobs and jobs of previous days are not reused
+        ExportJob.objects.filter(pk=job.pk).update(status='failed')
+        self.assertNotEqual(ExportJob.objects.request('csv', 1), job)
+        ExportJob.objects.update(status='done', created_at=timezone.now() - datetime.timedelta(days=1))
+        self.assertEqual(ExportJob.objects.filter(format='csv', data_version=1).count(), 2)
+        self.assertEqual(ExportJob.objects.request('csv', 1).status, 'pending')
+
+    def test_claim(self):
+        first = ExportJob.objects.request('csv', 1)
+        second = ExportJob.objects.request('xlsx', 1)
+        claimed = ExportJob.objects.claim()
+        self.assertEqual((claimed, claimed.status), (first, 'running'))
+        self.assertEqual(ExportJob.objects.claim(), second)
+        self.assertIsNone(ExportJob.objects.claim())
+
+    def test_run_export_job(self):
+        plan = Plan.objects.create(name='Reguläres Abo', slug='regular', price=50)
+        user = User.objects.create_user('leserin@example.com', first_name='Vorname', last_name='Nachname')
+        today = timezone.now().date()
+        create_subscription(user, plan, [(today, today + datetime.timedelta(days=365))])
+        create_subscription(user, plan, [(today - datetime.timedelta(days=400), today - datetime.timedelta(days=35))])
+
+        ExportJob.objects.request('csv', 1)
+        job = run_export_job(ExportJob.objects.claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.row_count), ('done', 100, 1))
+        with open(job.path(), encoding='utf-8') as file:
+            self.assertIn('Nachname', file.read())
+
+    def test_prune(self):
+        stale = ExportJob.objects.request('csv', 1)
+        ExportJob.objects.filter(pk=stale.pk).update(created_at=timezone.now() - settings.EXPORT_JOB_TIMEOUT * 2)
+        # A stale pending job is not reused, but failed
+        self.assertNotEqual(ExportJob.objects.request('csv', 1), stale)
+        prune_export_jobs()
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+
+        # Jobs and files are deleted after the retention period
+        os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+        expired = ExportJob.objects.create(format='csv', data_version=1, status='done', file_name='expired.csv')
+        open(expired.path(), 'w').close()
+        ExportJob.objects.filter(pk__in=[stale.pk, expired.pk]).update(
+            created_at=timezone.now() - settings.EXPORT_RETENTION * 2
+        )
+        self.assertEqual(prune_export_jobs(), 2)
+        self.assertFalse(os.path.exists(expired.path()))
+        self.assertEqual(ExportJob.objects.get().status, 'pending')
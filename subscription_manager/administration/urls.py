@@ -1,13 +1,18 @@
 from django.urls import path
 
 from .views import AdministrationHomeView, AdministrationStatisticsView, AdministrationStatisticsDataView,\
-    AdministrationPaymentListView, AdministrationSubscriptionExportView, payment_confirm
+    AdministrationCohortView, AdministrationPaymentListView, AdministrationSubscriptionExportView, \
+    AdministrationExportJobView, AdministrationExportJobDataView, export_job_download, payment_confirm
 
 urlpatterns = [
     path('', AdministrationHomeView.as_view(), name='administration_home'),
     path('exportieren/<str:format>/', AdministrationSubscriptionExportView.as_view(), name='administration_subscription_export'),
+    path('exportieren/auftrag/<int:job_id>/', AdministrationExportJobView.as_view(), name='administration_export_job'),
+    path('exportieren/auftrag/<int:job_id>/daten/', AdministrationExportJobDataView.as_view(), name='administration_export_job_data'),
+    path('exportieren/auftrag/<int:job_id>/herunterladen/', export_job_download, name='administration_export_job_download'),
     path('zahlungen/', AdministrationPaymentListView.as_view(), name='administration_payment_list'),
     path('zahlungen/<int:payment_id>/bestätigen/', payment_confirm, name='administration_payment_confirm'),
     path('statistik/', AdministrationStatisticsView.as_view(), name='administration_statistics'),
     path('statistik/daten/', AdministrationStatisticsDataView.as_view(), name='administration_statistics_data'),
+    path('statistik/kohorten/', AdministrationCohortView.as_view(), name='administration_cohorts'),
 ]
@@ -1,21 +1,29 @@
 import calendar
-import datetime
+import csv
 import re
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.exceptions import ValidationError
 from django.db.models import Q
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, HttpResponse, Http404
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from django.views.generic import ListView, TemplateView, View
+from django.utils.text import compress_sequence
+from django.views.generic import DetailView, ListView, TemplateView, View
 from django.utils import timezone
 
 from subscription_manager.payment.models import Payment
-from subscription_manager.subscription.models import Subscription, Period
+from subscription_manager.subscription.models import SubscriptionStatus
+from subscription_manager.subscription.statistics import get_statistics, month_range
 from subscription_manager.subscription.admin import ActiveSubscriptionResource
+from subscription_manager.subscription.analytics import cohort_retention
+from subscription_manager.utils.cache import get_data_version, get_or_compute
+from subscription_manager.utils.pagination import CachedCountPaginator
+
+from .models import ExportJob, JobRun
 
 @method_decorator(staff_member_required(login_url='login'), name='dispatch')
 class AdministrationHomeView(TemplateView):
@@ -27,9 +35,11 @@ class AdministrationHomeView(TemplateView):
 
     def get_context_data(self, **kwargs):
         """
-        Adds number of active subscriptions to the context.
+        Adds number of active subscriptions and the latest
+        run of each background job to the context.
         """
-        kwargs['active_subscriptions'] = Subscription.objects.filter(is_active=True).count()
+        kwargs['active_subscriptions'] = SubscriptionStatus.objects.filter(is_active=True).count()
+        kwargs['job_runs'] = JobRun.objects.latest_per_code()
 
         return super().get_context_data(**kwargs)
 
@@ -43,6 +53,7 @@ class AdministrationPaymentListView(ListView):
     template_name = 'administration/administration_payment_list.html'
     ordering = '-created_at'
     paginate_by = 10
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
         """
@@ -83,13 +94,26 @@ def payment_confirm(request, payment_id):
     return redirect('administration_payment_list')
 
 
+class Echo:
+    """
+    File-like object whose write method returns the written
+    value instead of storing it. Used to stream csv rows.
+    """
+    def write(self, value):
+        return value
+
+
 @method_decorator(staff_member_required(login_url='login'), name='dispatch')
 class AdministrationSubscriptionExportView(View):
     """
     Exports active subscriptions' addresses as .csv,
-    .ods, and .xlsx documents.
+    .ods, and .xlsx documents. The .csv document is streamed,
+    such that large exports start downloading immediately. The
+    other documents are rendered by the export worker.
     """
     format = 'csv'  # Default format is .csv
+    chunk_size = 2000  # Number of rows fetched from the database at once
+    rows_per_write = 100  # Number of csv rows sent at once
 
     def dispatch(self, request, *args, **kwargs):
         """
@@ -106,45 +130,100 @@ class AdministrationSubscriptionExportView(View):
 
         return super().dispatch(request, *args, **kwargs)
 
-    def content_type(self):
-        """
-        Return the format's corresponding content type.
+    def stream_csv(self):
         """
-        if self.format == 'csv':
-            return 'text/csv'
-        elif self.format == 'ods':
-            return 'application/vnd.oasis.opendocument.spreadsheet'
-        elif self.format == 'xlsx':
-            return 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        return ''
-
-    def content(self):
+        Yields the .csv document in pieces of multiple rows, while
+        the rows are read from the database in chunks.
         """
-        Return the content formatted as the requested document.
-        """
-        if self.format == 'csv':
-            return ActiveSubscriptionResource().export().csv
-        elif self.format == 'ods':
-            return ActiveSubscriptionResource().export().ods
-        elif self.format == 'xlsx':
-            return ActiveSubscriptionResource().export().xlsx
-        return ''
+        resource = ActiveSubscriptionResource()
+        writer = csv.writer(Echo())
+        rows = [writer.writerow(resource.get_export_headers())]
+        for row in resource.iter_rows(chunk_size=self.chunk_size):
+            rows.append(writer.writerow(row))
+            if len(rows) >= self.rows_per_write:
+                yield ''.join(rows).encode('utf-8')
+                rows = []
+        if rows:
+            yield ''.join(rows).encode('utf-8')
 
     def get(self, request, *args, **kwargs):
         """
-        Return the document as an attachement.
+        Return the .csv document as an attachement. It is compressed
+        if the client accepts gzip. The other formats are rendered
+        in the background, therefore redirect to their export job.
         """
-        response = HttpResponse(
-            content=self.content(),
-            content_type=self.content_type()
+        if self.format != 'csv':
+            job = ExportJob.objects.request(self.format, get_data_version(), user=request.user)
+            return redirect('administration_export_job', job_id=job.pk)
+
+        content = self.stream_csv()
+        gzip = re.search(r'\bgzip\b', request.META.get('HTTP_ACCEPT_ENCODING', '')) is not None
+        if gzip:
+            content = compress_sequence(content)
+        response = StreamingHttpResponse(
+            streaming_content=content,
+            content_type='text/csv'
         )
-        response['Content-Disposition'] = 'attachment; filename="{}-active-subscriptions.{}"'.format(
-            timezone.now().strftime('%Y-%m-%d'),
-            self.format
+        if gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Content-Disposition'] = 'attachment; filename="{}-active-subscriptions.csv"'.format(
+            timezone.now().strftime('%Y-%m-%d')
         )
         return response
 
 
+@method_decorator(staff_member_required(login_url='login'), name='dispatch')
+class AdministrationExportJobView(DetailView):
+    """
+    Displays the progress of an export job, which is polled from
+    the export job data view, and links to the finished document.
+    """
+    model = ExportJob
+    context_object_name = 'job'
+    pk_url_kwarg = 'job_id'
+    template_name = 'administration/administration_export_job.html'
+
+
+@method_decorator(staff_member_required(login_url='login'), name='dispatch')
+class AdministrationExportJobDataView(View):
+    """
+    Returns the status of an export job in JSON format.
+    """
+    def get(self, request, *args, **kwargs):
+        """
+        Returns a JSON response containing the job's status and progress.
+        """
+        # Get object or raise 404
+        job = get_object_or_404(ExportJob, pk=self.kwargs.get('job_id'))
+
+        return JsonResponse({
+            'status': job.status,
+            'progress': job.progress
+        })
+
+
+@staff_member_required(login_url='login')
+def export_job_download(request, job_id):
+    """
+    Returns the rendered document of a finished export job as an
+    attachement. If the web server serves the export root, only the
+    file's location is returned, so that the web server sends the file.
+    """
+    job = get_object_or_404(ExportJob, pk=job_id, status='done')
+
+    if settings.EXPORT_ACCEL_REDIRECT_URL:
+        response = HttpResponse(content_type=job.content_type())
+        response['X-Accel-Redirect'] = settings.EXPORT_ACCEL_REDIRECT_URL + job.file_name
+    else:
+        try:
+            response = FileResponse(open(job.path(), 'rb'), content_type=job.content_type())
+        except FileNotFoundError:
+            raise Http404()
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(job.download_name())
+    return response
+
+
 @method_decorator(staff_member_required(login_url='login'), name='dispatch')
 class AdministrationStatisticsView(TemplateView):
     """
@@ -155,13 +234,37 @@ class AdministrationStatisticsView(TemplateView):
 
 
 @method_decorator(staff_member_required(login_url='login'), name='dispatch')
-@method_decorator(cache_page(24*60*60), name='dispatch')
+class AdministrationCohortView(TemplateView):
+    """
+    Displays the renewal rates of subscription cohorts, grouped
+    by the month in which the subscriptions started.
+    """
+    template_name = 'administration/administration_cohorts.html'
+    cache_timeout = 24*60*60
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the cohorts, which are cached per data version, to the context.
+        """
+        cohorts = get_or_compute(
+            'cohorts:{}'.format(get_data_version()),
+            cohort_retention,
+            timeout=self.cache_timeout
+        )
+        kwargs['cohorts'] = cohorts
+        kwargs['periods'] = range(1, max((len(cohort['retention']) for cohort in cohorts), default=0) + 1)
+
+        return super().get_context_data(**kwargs)
+
+
+@method_decorator(staff_member_required(login_url='login'), name='dispatch')
 class AdministrationStatisticsDataView(View):
     """
-    Returns statistics data in JSON format.
+    Returns statistics data in JSON format. The data is cached per data
+    version, so it is shared between all workers and invalidated as soon
+    as subscriptions, periods or payments change.
     """
-    lower_bound_date = datetime.date.min
-    upper_bound_date = datetime.date.max
+    cache_timeout = 24*60*60
 
     def get(self, request, *args, **kwargs):
         """
@@ -177,27 +280,21 @@ class AdministrationStatisticsDataView(View):
                 'error': e.message
             })
 
-        # Store the lower and upper bound of subscription periods in order to
-        # not unnecessarily query the database
-        periods = Period.objects.filter(start_date__isnull=False, end_date__isnull=False).order_by('start_date')
-        if periods is not None:
-            self.lower_bound_date = periods.first().start_date
-            self.upper_bound_date = periods.last().end_date
-
-        # Get data
-        data_list_of_dicts = self.get_data(start_year, start_month, end_year, end_month)
-
-        # Rearrange data
-        data_dict_of_lists = {k: [dic[k] for dic in list(data_list_of_dicts.values())] for k in list(data_list_of_dicts.values())[0]}
-        data_dict_of_lists['time'] = list(data_list_of_dicts.keys())
+        # Get data from cache or compute it once for concurrent requests
+        key = 'statistics:{}:{}-{}:{}-{}'.format(get_data_version(), start_year, start_month, end_year, end_month)
+        data = get_or_compute(
+            key,
+            lambda: self.get_data(start_year, start_month, end_year, end_month),
+            timeout=self.cache_timeout
+        )
 
-        return JsonResponse(data_dict_of_lists)
+        return JsonResponse(data)
 
     def validate_parameters(self, request):
         """
         Checks whether the start and end parameter are in a valid
-        format. If they are, it trims them to the period in which
-        subscriptions exist.
+        format and whether the start lies before the end. Returns
+        the years and months of both.
         """
         start_arg = request.GET.get('start')
         end_arg = request.GET.get('end')
@@ -227,51 +324,16 @@ class AdministrationStatisticsDataView(View):
 
     def get_data(self, start_year, start_month, end_year, end_month):
         """
-        Loops over each month, gathers the relevant data and
-        arranges it into a dictionary.
-        """
-        data = dict()
-
-        if start_year == end_year:
-            year = start_year
-            for month in range(start_month, end_month + 1):
-                data.update(self.get_data_by_month(year, month))
-        else:
-            for year in range(start_year, end_year + 1):
-                if year == start_year:
-                    for month in range(start_month, 12 + 1):
-                        data.update(self.get_data_by_month(year, month))
-                elif year == end_year:
-                    for month in range(1, end_month + 1):
-                        data.update(self.get_data_by_month(year, month))
-                else:
-                    for month in range(1, 12 + 1):
-                        data.update(self.get_data_by_month(year, month))
-
-        return data
-
-    def get_data_by_month(self, year, month):
-        """
-        Returns a dictionary containing the aggregated values of the
-        requested month.
+        Reads the data of all months from the monthly statistics
+        and arranges it into a dictionary of lists.
         """
-        if self.lower_bound_date.year > year or (self.lower_bound_date.year == year and self.lower_bound_date.month > month) \
-                or self.upper_bound_date.year < year or (self.upper_bound_date.year == year and self.lower_bound_date.month < month):
-            # If request month is out of range, return zero values.
-            return {
-                '{} {}'.format(calendar.month_abbr[month], year % 100): {
-                    'active': 0,
-                    'new': 0,
-                    'renewed': 0,
-                    'expired': 0,
-                }
-            }
+        months = month_range(start_year, start_month, end_year, end_month)
+        statistics = get_statistics(months)
 
         return {
-            '{} {}'.format(calendar.month_abbr[month], year % 100): {
-                'active': Subscription.objects.get_active_by_month(year, month).count(),
-                'new': Subscription.objects.get_new_by_month(year, month).count(),
-                'renewed': Subscription.objects.get_renewed_by_month(year, month).count(),
-                'expired': Subscription.objects.get_expired_by_month(year, month).count() + Subscription.objects.get_canceled_by_month(year, month).count(),
-            }
+            'active': [statistics[month]['active'] for month in months],
+            'new': [statistics[month]['new'] for month in months],
+            'renewed': [statistics[month]['renewed'] for month in months],
+            'expired': [statistics[month]['expired'] + statistics[month]['canceled'] for month in months],
+            'time': ['{} {}'.format(calendar.month_abbr[month.month], month.year % 100) for month in months]
         }
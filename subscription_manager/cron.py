@@ -1,32 +1,126 @@
+import random
+
 from django_cron import CronJobBase, Schedule
+from django_cron.models import CronJobLog
 
+from django.conf import settings
+from django.contrib.sessions.models import Session
 from django.core.management import call_command
+from django.utils import timezone
+
+from subscription_manager.administration.leases import Lease
+from subscription_manager.administration.models import JobRun
+from subscription_manager.subscription.analytics import IntervalEngine
+from subscription_manager.subscription.models import ScheduledNotification, SubscriptionStatus
+from subscription_manager.subscription.statistics import mark_all_statistics_stale, update_stale_statistics
+from subscription_manager.subscription.tasks import send_scheduled_notifications
+from subscription_manager.user.models import ConsumedToken, EmailAddress, RateLimitCounter, Token
+from subscription_manager.utils.purge import purge_all
+
+
+class CronJob(CronJobBase):
+    """
+    Base class of the cron jobs. Subclasses implement run, which returns
+    the number of processed rows. The number is recorded by the scheduler
+    and stored as message in the cron job log. Runs taking longer than the
+    timeout (default: SCHEDULER_JOB_TIMEOUT) are reported by the scheduler.
+    """
+    timeout = None
+    rows = None
+
+    def do(self):
+        self.rows = self.run()
+        if self.rows is None:
+            return ''
+        return '{} Zeilen verarbeitet.'.format(self.rows)
 
-from subscription_manager.subscription.tasks import send_expiration_emails
-from subscription_manager.user.models import Token
+    def run(self):
+        raise NotImplementedError
 
 
-class SendEmails(CronJobBase):
+class SendEmails(CronJob):
     schedule = Schedule(run_at_times=['07:00'])
     code = 'send_emails'
+    # Runs on all nodes at once, which share the work by shards
+    ALLOW_PARALLEL_RUNS = True
 
-    def do(self):
+    def run(self):
         """
-        Send notification emails to users whose subscriptions are
-        expiring within 30 days or whose subscription end in 1 day.
+        Send the scheduled notification emails to users whose
+        subscriptions expire within 30 days or end in 1 day.
+        Reminders missed by previous runs are sent as well.
+        Each shard of reminders is sent by the node which
+        acquires its lease first.
         """
-        send_expiration_emails(remaining_days=30)
-        send_expiration_emails(remaining_days=1)
+        ScheduledNotification.objects.schedule_upcoming()
+
+        shards = list(range(settings.NOTIFICATION_SHARDS))
+        random.shuffle(shards)
+        sent = 0
+        for shard in shards:
+            with Lease('send_emails:{}'.format(shard)) as acquired:
+                if acquired:
+                    sent += send_scheduled_notifications(shard=shard, shards=len(shards))
+        return sent
 
 
-class CleanDatabase(CronJobBase):
+class RefreshSubscriptionStatus(CronJob):
+    schedule = Schedule(run_at_times=['00:05'])
+    code = 'refresh_subscription_status'
+
+    def run(self):
+        """
+        Refresh the status of subscriptions with periods that started
+        or ended since the last run, as they might have become active
+        or inactive.
+        """
+        last_run = CronJobLog.objects.filter(code=self.code, is_success=True).order_by('-start_time').first()
+        if last_run is None:
+            return SubscriptionStatus.objects.rebuild()
+        return len(SubscriptionStatus.objects.refresh_due(since=last_run.start_time.date()))
+
+
+class UpdateStatistics(CronJob):
+    schedule = Schedule(run_every_mins=55)
+    code = 'update_statistics'
+
+    def run(self):
+        """
+        Recompute the monthly statistics of all months which were
+        affected by changes since the last run. On the first run,
+        all months are computed.
+        """
+        if not CronJobLog.objects.filter(code=self.code, is_success=True).exists():
+            # Backfill all months from arrays loaded at once
+            mark_all_statistics_stale()
+            return update_stale_statistics(compute=IntervalEngine.load().compute)
+        return update_stale_statistics()
+
+
+class CleanDatabase(CronJob):
     schedule = Schedule(run_at_times=['04:00'])
     code = 'clean_database'
 
-    def do(self):
+    def run(self):
         """
-        Clear expired sessions and remove expired tokens
-        each day at 4 am.
+        Remove expired sessions, expired tokens, abandoned email
+        addresses, reminders of ended subscriptions, old job runs and
+        expired rate limit counters each day at 4 am. Rows are deleted in batches within
+        a time budget, a remaining backlog is deleted in the next run.
         """
-        call_command('clearsessions', '--verbosity=0')
-        Token.objects.all_expired().delete()
\ No newline at end of file
+        querysets = []
+        if settings.SESSION_ENGINE in ['django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db']:
+            querysets.append(Session.objects.filter(expire_date__lt=timezone.now()))
+        else:
+            call_command('clearsessions', '--verbosity=0')
+        querysets += [
+            Token.objects.all_expired(),
+            ConsumedToken.objects.filter(valid_until__lt=timezone.now()),
+            # Email addresses are purged after their tokens
+            EmailAddress.objects.all_abandoned(),
+            ScheduledNotification.objects.filter(end_date__lt=timezone.now().date()),
+            JobRun.objects.filter(started_at__lt=timezone.now() - settings.JOB_RUN_RETENTION),
+            RateLimitCounter.objects.filter(expires_at__lt=timezone.now())
+        ]
+        counts, complete = purge_all(querysets)
+        return sum(counts.values())
\ No newline at end of file
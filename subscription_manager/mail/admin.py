@@ -0,0 +1,20 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """
+    Outgoing email model admin
+    """
+    list_display = ['subject', 'to', 'priority', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'priority']
+    search_fields = ['subject', 'to']
+    ordering = ['-created_at']
+    actions = ['retry']
+
+    def retry(self, request, queryset):
+        queryset.exclude(status='sent').update(status='queued', attempts=0, next_attempt_at=timezone.now())
+    retry.short_description = 'Erneut senden'
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class MailConfig(AppConfig):
+    name = 'subscription_manager.mail'
+
+    def ready(self):
+        from .rendering import load_email_templates
+        load_email_templates()
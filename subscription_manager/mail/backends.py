@@ -0,0 +1,152 @@
+import atexit
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+
+
+class ConnectionPool:
+    """
+    Keeps authenticated SMTP connections of the current process open for
+    reuse. Connections are grouped by server and account. Connections which
+    have been idle for too long or which do not respond to a NOOP command
+    are closed instead of being reused.
+    """
+    def __init__(self):
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, idle_timeout):
+        """
+        Returns a healthy connection of the given key or None.
+        """
+        while True:
+            with self.lock:
+                connections = self.connections.get(key)
+                if not connections:
+                    return None
+                connection, released_at = connections.pop()
+
+            if time.monotonic() - released_at <= idle_timeout:
+                try:
+                    if connection.noop()[0] == 250:
+                        return connection
+                except (OSError, smtplib.SMTPException):
+                    pass
+            self.quit(connection)
+
+    def put(self, key, connection, size):
+        """
+        Returns a connection to the pool. If the pool is full,
+        the connection is closed instead.
+        """
+        with self.lock:
+            connections = self.connections.setdefault(key, [])
+            if len(connections) < size:
+                connections.append((connection, time.monotonic()))
+                return
+        self.quit(connection)
+
+    def clear(self):
+        """
+        Closes all pooled connections.
+        """
+        with self.lock:
+            connections = [connection for pooled in self.connections.values() for connection, _ in pooled]
+            self.connections = {}
+        for connection in connections:
+            self.quit(connection)
+
+    @staticmethod
+    def quit(connection):
+        """
+        Closes a connection, ignoring connections which are already broken.
+        """
+        try:
+            connection.quit()
+        except (OSError, smtplib.SMTPException):
+            connection.close()
+
+
+pool = ConnectionPool()
+atexit.register(pool.clear)
+
+
+class PooledEmailBackend(EmailBackend):
+    """
+    SMTP email backend which takes its connection from a pool instead of
+    opening a new one for every message, such that the TCP, TLS and login
+    handshakes are only made once per pooled connection. Connections are
+    returned to the pool when the backend is closed and discarded after
+    errors. A message that fails because a pooled connection has been
+    dropped by the server is sent once more over a new connection.
+    """
+    def __init__(self, *args, pool_size=None, idle_timeout=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_size = settings.EMAIL_POOL_SIZE if pool_size is None else pool_size
+        self.idle_timeout = settings.EMAIL_POOL_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+
+    @property
+    def pool_key(self):
+        return self.host, self.port, self.username, self.use_tls, self.use_ssl
+
+    def open(self):
+        """
+        Takes a connection from the pool or opens a new one. Returns True
+        in both cases, such that the connection is released after sending.
+        """
+        if self.connection:
+            return False
+
+        self.connection = pool.get(self.pool_key, self.idle_timeout)
+        if self.connection is not None:
+            return True
+        return super().open()
+
+    def close(self):
+        """
+        Returns the connection to the pool instead of closing it.
+        """
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        pool.put(self.pool_key, connection, self.pool_size)
+
+    def discard(self):
+        """
+        Closes the connection without returning it to the pool.
+        """
+        super().close()
+
+    def send_messages(self, email_messages):
+        """
+        Sends one or more EmailMessage objects and returns the number of
+        sent messages. If the connection has been dropped, it reconnects
+        once and sends the message again.
+        """
+        if not email_messages:
+            return 0
+        with self._lock:
+            new_conn_created = self.open()
+            if not self.connection or new_conn_created is None:
+                return 0
+            num_sent = 0
+            try:
+                for message in email_messages:
+                    try:
+                        sent = self._send(message)
+                    except smtplib.SMTPServerDisconnected:
+                        self.discard()
+                        if not super().open():
+                            raise
+                        sent = self._send(message)
+                    if sent:
+                        num_sent += 1
+            except Exception:
+                self.discard()
+                raise
+            if new_conn_created:
+                self.close()
+        return num_sent
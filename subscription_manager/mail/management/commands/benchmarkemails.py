@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from subscription_manager.mail.rendering import render_emails
+from subscription_manager.user.models import EmailAddress
+from subscription_manager.user.tokens import SignedToken
+
+
+class Command(BaseCommand):
+    help = 'Measures how fast expiration reminders are rendered.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=50000,
+            help='Number of reminders to render.'
+        )
+
+    def handle(self, *args, **options):
+        # The contexts do not need the database, like those of send_expiration_emails
+        valid_until = timezone.now() + timezone.timedelta(days=1)
+        contexts = [
+            {
+                'to_name': 'Leserin {}'.format(i),
+                'subscription_id': i,
+                'token': SignedToken(EmailAddress(pk=i), 'login', valid_until),
+                'remaining_days': 'in 30 Tagen'
+            }
+            for i in range(1, options['count'] + 1)
+        ]
+
+        started_at = time.perf_counter()
+        bodies = render_emails('emails/subscription_expiration.txt', contexts)
+        duration = time.perf_counter() - started_at
+        self.stdout.write('Rendered {} reminders in {:.2f} s ({:.0f} per second).'.format(
+            len(bodies), duration, len(bodies) / duration
+        ))
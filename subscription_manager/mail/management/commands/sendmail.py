@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from subscription_manager.mail.outbox import deliver
+
+
+class Command(BaseCommand):
+    help = 'Sends queued emails in the order of their priority.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send all due emails and exit instead of waiting for new ones.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of emails sent over one connection.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Seconds to wait between checks for new emails.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+
+            # Claim small batches, such that new emails with a higher priority are sent next
+            if deliver(batch_size=options['batch_size']):
+                continue
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class OutgoingEmailManager(models.Manager):
+    def due(self):
+        """
+        Returns all queued emails whose next attempt is due, the
+        ones with the highest priority and the oldest ones first.
+        """
+        return self.filter(
+            status='queued',
+            next_attempt_at__lte=timezone.now()
+        ).order_by('priority', 'next_attempt_at', 'pk')
+
+    def claim(self, batch_size, lease):
+        """
+        Claims a batch of due emails for sending. Their next attempt is
+        postponed by the lease, such that other workers skip them and
+        they are retried if the worker dies while sending them.
+        """
+        with transaction.atomic():
+            emails = list(self.due().select_for_update(skip_locked=True)[:batch_size])
+            self.filter(pk__in=[email.pk for email in emails]).update(
+                next_attempt_at=timezone.now() + lease,
+                attempts=models.F('attempts') + 1
+            )
+        for email in emails:
+            email.attempts += 1
+        return emails
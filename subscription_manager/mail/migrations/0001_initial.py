@@ -0,0 +1,43 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Betreff')),
+                ('body', models.TextField(verbose_name='Inhalt')),
+                ('from_email', models.CharField(max_length=255, verbose_name='Absender')),
+                ('to', models.JSONField(default=list, verbose_name='Empfänger')),
+                ('cc', models.JSONField(blank=True, default=list, verbose_name='Kopie')),
+                ('bcc', models.JSONField(blank=True, default=list, verbose_name='Blindkopie')),
+                ('reply_to', models.JSONField(blank=True, default=list, verbose_name='Antwort an')),
+                ('priority', models.PositiveSmallIntegerField(choices=[(0, 'Hoch'), (1, 'Normal'), (2, 'Tief')], default=1, verbose_name='Priorität')),
+                ('status', models.CharField(choices=[('queued', 'In Warteschlange'), ('sent', 'Gesendet'), ('failed', 'Fehlgeschlagen')], default='queued', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Versuche')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Nächster Versuch am')),
+                ('last_error', models.TextField(blank=True, verbose_name='Letzter Fehler')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Erstellt am')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Gesendet am')),
+            ],
+            options={
+                'verbose_name': 'Ausgehende E-Mail',
+                'verbose_name_plural': 'Ausgehende E-Mails',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(fields=['status', 'priority', 'next_attempt_at'], name='mail_outgoi_status_b6d3d0_idx'),
+        ),
+    ]
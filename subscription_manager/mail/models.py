@@ -0,0 +1,130 @@
+from django.core.mail import EmailMessage
+from django.db import models
+from django.utils import timezone
+
+from .managers import OutgoingEmailManager
+
+
+class OutgoingEmail(models.Model):
+    """
+    Email which has been queued for sending. Emails are sent
+    by the mail worker in the order of their priority, such
+    that login links are not delayed by bulk reminders.
+    """
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    subject = models.CharField(
+        max_length=255,
+        verbose_name='Betreff'
+    )
+    body = models.TextField(
+        verbose_name='Inhalt'
+    )
+    from_email = models.CharField(
+        max_length=255,
+        verbose_name='Absender'
+    )
+    to = models.JSONField(
+        default=list,
+        verbose_name='Empfänger'
+    )
+    cc = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='Kopie'
+    )
+    bcc = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='Blindkopie'
+    )
+    reply_to = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='Antwort an'
+    )
+    priority = models.PositiveSmallIntegerField(
+        choices=(
+            (HIGH, 'Hoch'),
+            (NORMAL, 'Normal'),
+            (LOW, 'Tief')
+        ),
+        default=NORMAL,
+        verbose_name='Priorität'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=(
+            ('queued', 'In Warteschlange'),
+            ('sent', 'Gesendet'),
+            ('failed', 'Fehlgeschlagen')
+        ),
+        default='queued',
+        verbose_name='Status'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Versuche'
+    )
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Nächster Versuch am'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Letzter Fehler'
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Erstellt am'
+    )
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Gesendet am'
+    )
+
+    objects = OutgoingEmailManager()
+
+    class Meta:
+        verbose_name = 'Ausgehende E-Mail'
+        verbose_name_plural = 'Ausgehende E-Mails'
+        indexes = [
+            models.Index(fields=['status', 'priority', 'next_attempt_at'])
+        ]
+
+    def __str__(self):
+        return '{} ({})'.format(self.subject, ', '.join(self.to))
+
+    @classmethod
+    def from_message(cls, message, priority=NORMAL):
+        """
+        Returns an unsaved outgoing email with the content of an email message.
+        """
+        return cls(
+            subject=message.subject,
+            body=message.body,
+            from_email=message.from_email,
+            to=list(message.to),
+            cc=list(message.cc),
+            bcc=list(message.bcc),
+            reply_to=list(message.reply_to),
+            priority=priority
+        )
+
+    def message(self, connection=None):
+        """
+        Returns the email message to be sent.
+        """
+        return EmailMessage(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=self.to,
+            cc=self.cc,
+            bcc=self.bcc,
+            reply_to=self.reply_to,
+            connection=connection
+        )
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.mail import get_connection
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+def enqueue(message, priority=OutgoingEmail.NORMAL):
+    """
+    Queues an email message, which is sent by the mail worker once the
+    current transaction has been committed. If the outbox is disabled,
+    the message is sent right away instead.
+    """
+    if not settings.EMAIL_OUTBOX:
+        message.send(fail_silently=False)
+        return None
+    email = OutgoingEmail.from_message(message, priority)
+    email.save()
+    return email
+
+
+def enqueue_many(messages, priority=OutgoingEmail.LOW, connection=None):
+    """
+    Queues multiple email messages with a single query. If the outbox
+    is disabled, the messages are sent over one connection instead.
+    Returns the number of queued or sent messages.
+    """
+    if not settings.EMAIL_OUTBOX:
+        if connection is None:
+            connection = get_connection(fail_silently=False)
+        return connection.send_messages(messages) or 0
+    OutgoingEmail.objects.bulk_create([OutgoingEmail.from_message(message, priority) for message in messages])
+    return len(messages)
+
+
+def retry_delay(attempts):
+    """
+    Returns the delay before the next attempt, which doubles with every failed attempt.
+    """
+    return settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def deliver(batch_size=50):
+    """
+    Sends a batch of due emails over a single connection and stores the
+    status of each email. Failed emails are retried with an exponential
+    backoff until the maximum number of attempts has been reached.
+    Returns the number of processed emails.
+    """
+    emails = OutgoingEmail.objects.claim(batch_size, lease=settings.EMAIL_OUTBOX_LEASE)
+    if not emails:
+        return 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        for email in emails:
+            try:
+                # Opening the connection once keeps it open for all emails
+                connection.open()
+                email.message(connection=connection).send(fail_silently=False)
+            except Exception as e:
+                # The connection might be broken, reconnect for the next email
+                connection.close()
+                email.last_error = repr(e)
+                if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                    email.status = 'failed'
+                else:
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                email.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+            else:
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.save(update_fields=['status', 'sent_at'])
+    finally:
+        connection.close()
+
+    return len(emails)
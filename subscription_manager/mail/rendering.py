@@ -0,0 +1,56 @@
+import os
+
+from django.conf import settings
+from django.template import engines
+
+EMAIL_TEMPLATE_DIR = 'emails'
+
+# Compiled email templates by name, e.g. 'emails/token_login.txt'
+templates = {}
+
+
+def load_email_templates():
+    """
+    Compiles all email templates of the template directories once, such
+    that rendering an email neither searches nor parses its template.
+    """
+    engine = engines['django']
+    for directory in engine.engine.dirs:
+        email_directory = os.path.join(directory, EMAIL_TEMPLATE_DIR)
+        if not os.path.isdir(email_directory):
+            continue
+        for file_name in sorted(os.listdir(email_directory)):
+            if file_name.endswith('.txt'):
+                name = '{}/{}'.format(EMAIL_TEMPLATE_DIR, file_name)
+                templates.setdefault(name, engine.get_template(name))
+
+
+def get_email_template(name):
+    """
+    Returns the compiled email template. Templates which have not
+    been compiled at startup are compiled on their first use. In
+    debug mode, templates are reloaded such that changes show up.
+    """
+    if settings.DEBUG:
+        return engines['django'].get_template(name)
+    template = templates.get(name)
+    if template is None:
+        template = templates[name] = engines['django'].get_template(name)
+    return template
+
+
+def render_email(name, context):
+    """
+    Renders an email template with the given context.
+    """
+    return get_email_template(name).render(context)
+
+
+def render_emails(name, contexts):
+    """
+    Renders an email template with each of the given contexts and returns
+    the bodies in the same order. The template is looked up once for all
+    contexts.
+    """
+    template = get_email_template(name)
+    return [template.render(context) for context in contexts]
@@ -0,0 +1,208 @@
+import smtplib
+import socket
+import socketserver
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail import EmailMessage, get_connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from subscription_manager.user.models import User
+
+from .backends import pool
+from .models import OutgoingEmail
+from .outbox import deliver, enqueue
+from .rendering import render_email, render_emails
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one connection of a minimal SMTP server, which accepts and
+    counts all messages.
+    """
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().split(' ')[0].upper()
+            if command == 'EHLO':
+                self.reply('250 localhost')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in [b'.\r\n', b'']:
+                    pass
+                self.server.messages += 1
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = 0
+
+
+class PooledEmailBackendTests(SimpleTestCase):
+    """
+    Sends messages to a local SMTP server with and without pooled connections.
+    """
+    message_count = 200
+
+    def setUp(self):
+        self.server = SMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        pool.clear()
+
+    def tearDown(self):
+        pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def send(self, backend, count):
+        """
+        Sends each message over its own backend instance like the
+        application does.
+        """
+        for i in range(count):
+            connection = get_connection(
+                backend,
+                host='127.0.0.1',
+                port=self.server.server_address[1],
+                username='',
+                password='',
+                use_tls=False,
+                use_ssl=False
+            )
+            EmailMessage('Betreff', 'Text', 'server@example.com', ['leserin@example.com'], connection=connection).send()
+
+    def test_connections(self):
+        # Without pooling, each message opens its own SMTP session
+        self.send('django.core.mail.backends.smtp.EmailBackend', self.message_count)
+        self.assertEqual(self.server.connections, self.message_count)
+
+        # With pooling, all messages are sent over a single session
+        self.send('subscription_manager.mail.backends.PooledEmailBackend', self.message_count)
+        self.assertEqual(self.server.messages, 2 * self.message_count)
+        self.assertEqual(self.server.connections, self.message_count + 1)
+
+    def test_reconnect_after_drop(self):
+        self.send('subscription_manager.mail.backends.PooledEmailBackend', 1)
+        for connections in pool.connections.values():
+            for connection, _ in connections:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+
+        self.send('subscription_manager.mail.backends.PooledEmailBackend', 1)
+        self.assertEqual(self.server.messages, 2)
+        self.assertEqual(self.server.connections, 2)
+
+
+class RenderEmailsTests(SimpleTestCase):
+    """
+    Renders an email template with several contexts.
+    """
+    def test_render_emails(self):
+        contexts = [{'to_name': 'Leserin {}'.format(i)} for i in range(10)]
+        bodies = render_emails('emails/token_login.txt', contexts)
+        self.assertEqual(bodies, [render_email('emails/token_login.txt', context) for context in contexts])
+        self.assertIn('Leserin 9', bodies[9])
+
+
+@override_settings(
+    EMAIL_OUTBOX=True,
+    EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class OutboxTests(TestCase):
+    """
+    Queues emails in the outbox and delivers them like the mail worker.
+    """
+    def enqueue(self, subject, priority=OutgoingEmail.NORMAL):
+        return enqueue(EmailMessage(subject, 'Text', 'server@example.com', ['leserin@example.com']), priority)
+
+    def deliver_at(self, now, **kwargs):
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            return deliver(**kwargs)
+
+    def test_priority(self):
+        self.enqueue('Erinnerung', OutgoingEmail.LOW)
+        self.enqueue('Zahlungsbestätigung')
+        self.enqueue('Anmeldelink', OutgoingEmail.HIGH)
+        self.assertEqual(deliver(batch_size=1), 1)
+        self.assertEqual([message.subject for message in mail.outbox], ['Anmeldelink'])
+        self.assertEqual(deliver(), 2)
+        self.assertEqual([message.subject for message in mail.outbox], ['Anmeldelink', 'Zahlungsbestätigung', 'Erinnerung'])
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+    @mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=smtplib.SMTPServerDisconnected)
+    def test_retry_with_backoff(self, send_messages):
+        email = self.enqueue('Anmeldelink')
+        now = timezone.now()
+        self.assertEqual(self.deliver_at(now), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('queued', 1))
+        self.assertIn('SMTPServerDisconnected', email.last_error)
+        self.assertEqual(email.next_attempt_at, now + settings.EMAIL_OUTBOX_RETRY_DELAY)
+
+        # Not retried before its next attempt is due
+        self.assertEqual(self.deliver_at(now + settings.EMAIL_OUTBOX_RETRY_DELAY / 2), 0)
+
+        # The delay doubles with every failed attempt
+        now = email.next_attempt_at
+        self.assertEqual(self.deliver_at(now), 1)
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(email.next_attempt_at, now + 2 * settings.EMAIL_OUTBOX_RETRY_DELAY)
+
+        # A later attempt succeeds
+        send_messages.side_effect = None
+        send_messages.return_value = 1
+        self.assertEqual(self.deliver_at(email.next_attempt_at), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('sent', 3))
+
+    @mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=smtplib.SMTPServerDisconnected)
+    def test_give_up_after_max_attempts(self, send_messages):
+        email = self.enqueue('Anmeldelink')
+        now = timezone.now()
+        for attempt in range(settings.EMAIL_OUTBOX_MAX_ATTEMPTS):
+            now += settings.EMAIL_OUTBOX_LEASE
+            self.assertEqual(self.deliver_at(now), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', settings.EMAIL_OUTBOX_MAX_ATTEMPTS))
+        self.assertEqual(self.deliver_at(now + settings.EMAIL_OUTBOX_LEASE * 10), 0)
+        self.assertEqual(send_messages.call_count, settings.EMAIL_OUTBOX_MAX_ATTEMPTS)
+
+    def test_admin_retry(self):
+        failed = self.enqueue('Anmeldelink')
+        sent = self.enqueue('Erinnerung')
+        OutgoingEmail.objects.filter(pk=failed.pk).update(status='failed', attempts=3)
+        OutgoingEmail.objects.filter(pk=sent.pk).update(status='sent', attempts=1)
+
+        self.client.force_login(User.objects.create_superuser('admin@example.com', 'passwort'))
+        response = self.client.post('/admin/mail/outgoingemail/', {
+            'action': 'retry',
+            '_selected_action': [failed.pk, sent.pk]
+        })
+        self.assertEqual(response.status_code, 302)
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), ('queued', 0))
+        self.assertEqual(OutgoingEmail.objects.get(pk=sent.pk).status, 'sent')
+
+        self.assertEqual(deliver(), 1)
+        self.assertEqual([message.subject for message in mail.outbox], ['Anmeldelink'])
@@ -1,5 +1,7 @@
 from django.contrib import admin
 
+from subscription_manager.utils.pagination import CachedCountPaginator
+
 from .models import Payment
 
 
@@ -36,10 +38,13 @@ class PaymentAdmin(admin.ModelAdmin):
     list_display = ['account_name_field', 'address_name_field', 'amount', 'method', 'code',  'is_paid', 'paid_at']
     search_fields = [
         'amount', 'id', 'period__subscription__last_name', 'period__subscription__user__first_name',
-        'period__subscription__user__last_name', 'period__subscription__user__first_name'
+        'period__subscription__user__last_name'
     ]
     actions = ['confirm_payments']
     list_filter = [IsPaidListFilter, 'method', 'amount']
+    list_select_related = ['period__subscription__user']
+    paginator = CachedCountPaginator
+    show_full_result_count = False
 
     def account_name_field(self, obj):
         return obj.period.subscription.user.full_name()
@@ -53,6 +58,3 @@ class PaymentAdmin(admin.ModelAdmin):
         for obj in queryset:
             obj.confirm()
     confirm_payments.short_description = 'Ausgewählte Zahlungen bestätigen'
-
-    def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('period__subscription__user')
@@ -1,9 +1,10 @@
 from django.conf import settings
 from django.core.mail import EmailMessage
 from django.db import models, IntegrityError, transaction
-from django.template.loader import render_to_string
 from django.utils import timezone
 
+from subscription_manager.mail.outbox import enqueue
+from subscription_manager.mail.rendering import render_email
 from subscription_manager.subscription.models import Period, Subscription
 
 
@@ -112,7 +113,7 @@ class Payment(models.Model):
 
         email = EmailMessage(
             subject=settings.EMAIL_SUBJECT_PREFIX + 'Rechnung',
-            body=render_to_string(template, {
+            body=render_email(template, {
                 'to_name': self.period.subscription.user.first_name,
                 'payment': self
             }),
@@ -121,7 +122,7 @@ class Payment(models.Model):
             to=[self.period.subscription.user.email],
             bcc=[settings.ACCOUNTING_EMAIL]  # Add accounting email
         )
-        email.send(fail_silently=False)
+        enqueue(email)
 
     def confirm(self):
         """
@@ -150,7 +151,7 @@ class Payment(models.Model):
         # Send confirmation email
         email = EmailMessage(
             subject=settings.EMAIL_SUBJECT_PREFIX + subject,
-            body=render_to_string(template, {
+            body=render_email(template, {
                 'to_name': self.period.subscription.user.first_name,
                 'payment': self
             }),
@@ -158,4 +159,4 @@ class Payment(models.Model):
             reply_to=[settings.DEFAULT_REPLY_TO_EMAIL],
             to=[self.period.subscription.user.email]
         )
-        email.send(fail_silently=False)
+        enqueue(email)
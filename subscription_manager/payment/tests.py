@@ -0,0 +1,29 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from subscription_manager.subscription.models import Plan
+from subscription_manager.subscription.tests import create_subscription
+from subscription_manager.utils.testing import ChangelistQueriesMixin
+
+
+class PaymentAdminTests(ChangelistQueriesMixin, TestCase):
+    """
+    The payment changelist costs the same number of queries regardless
+    of the number of rows on the page: session, user, count, amount
+    filter choices and rows.
+    """
+    urls = [
+        ('/admin/payment/payment/', 5),
+        ('/admin/payment/payment/?is_paid=paid&method__exact=invoice&q=Nachname', 5),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.plan = Plan.objects.create(name='Reguläres Abo', slug='regular', price=50)
+
+    def create_rows(self, user):
+        today = timezone.now().date()
+        create_subscription(user, self.plan, [(today, today + datetime.timedelta(days=365))])
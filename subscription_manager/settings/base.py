@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django_cron',
     'import_export',
     'subscription_manager.administration.apps.AdministrationConfig',
+    'subscription_manager.mail.apps.MailConfig',
     'subscription_manager.payment.apps.PaymentConfig',
     'subscription_manager.subscription.apps.SubscriptionConfig',
     'subscription_manager.user.apps.UserConfig'
@@ -126,10 +127,30 @@ SERVER_EMAIL = 'server@zs-online.ch'
 ADMINS = [('ZS Informatik', 'informatik@medienverein.ch')]
 ACCOUNTING_EMAIL = 'abo@zs-online.ch'
 
+# Emails are queued and sent by the mail worker ("python manage.py sendmail")
+EMAIL_OUTBOX = True
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = timezone.timedelta(minutes=1)
+EMAIL_OUTBOX_LEASE = timezone.timedelta(minutes=10)
+
+# Pooled SMTP connections per process (used by the pooled email backend)
+EMAIL_POOL_SIZE = 2
+EMAIL_POOL_IDLE_TIMEOUT = 60  # Seconds
+
 CRON_CLASSES = [
     'subscription_manager.cron.SendEmails',
+    'subscription_manager.cron.RefreshSubscriptionStatus',
+    'subscription_manager.cron.UpdateStatistics',
     'subscription_manager.cron.CleanDatabase'
 ]
+SCHEDULER_JOB_TIMEOUT = timezone.timedelta(hours=1)
+JOB_RUN_RETENTION = timezone.timedelta(days=30)
+
+# Cron jobs run on one node at a time, expired leases of dead nodes are taken over
+DJANGO_CRON_LOCK_BACKEND = 'subscription_manager.administration.leases.LeaseLock'
+JOB_LEASE_DURATION = timezone.timedelta(minutes=5)
+JOB_LEASE_ADVISORY_LOCKS = True  # Use advisory locks instead of the lease table on PostgreSQL
+NOTIFICATION_SHARDS = 4
 
 COMPRESS_ENABLED = True
 COMPRESS_PRECOMPILERS = (
@@ -141,6 +162,23 @@ COMPRESS_OUTPUT_DIR = 'cache'
 LIBSASS_OUTPUT_STYLE = 'compressed'
 LIBSASS_SOURCEMAPS = True
 
+# Exports rendered by the export worker
+EXPORT_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'exports')
+EXPORT_RETENTION = timezone.timedelta(days=7)
+EXPORT_JOB_TIMEOUT = timezone.timedelta(hours=1)
+EXPORT_ACCEL_REDIRECT_URL = None  # Internal web server location of the export root, if any
+
 TOKENS_PER_USER_PER_HOUR = 20
 TOKEN_EXPIRATION = timezone.timedelta(days=1)
+TOKEN_MODE = 'signed'  # 'signed' or 'database'
+UNVERIFIED_EMAIL_ADDRESS_RETENTION = timezone.timedelta(days=30)
 PERIOD_OF_PAYMENT = timezone.timedelta(days=30)
+EXPIRATION_REMINDER_DAYS = [30, 1]  # Days before the end of a subscription
+
+# Expired rows are deleted in batches within a time budget each night
+PURGE_BATCH_SIZE = 1000
+PURGE_TIME_BUDGET = timezone.timedelta(minutes=10)
+
+# Paginated lists are counted once per data version, large unfiltered tables are estimated
+COUNT_CACHE_TIMEOUT = timezone.timedelta(minutes=5)
+COUNT_ESTIMATE_THRESHOLD = 100000  # Rows
@@ -21,3 +21,4 @@ DATABASES = {
 
 # Email
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+EMAIL_OUTBOX = False  # Print emails right away instead of queuing them
@@ -26,11 +26,30 @@ DATABASES = {
 }
 CONN_MAX_AGE = None
 
-SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+# Cache (shared by all workers, create the table with "python manage.py createcachetable").
+# Without explicit values, entries would expire after 5 minutes and be culled beyond 300 entries.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache',
+        'TIMEOUT': 24*60*60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000
+        }
+    }
+}
+
+# Exports (served by nginx from an internal location mapped to the export root)
+EXPORT_ROOT = '/srv/subscription-manager/exports'
+EXPORT_ACCEL_REDIRECT_URL = '/exports/'
+
+# Sessions are stored in the database and read through the cache, culling does not log users out
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
 SESSION_CACHE_ALIAS = "default"
 SESSION_COOKIE_SECURE = True
 
 # Email
+EMAIL_BACKEND = 'subscription_manager.mail.backends.PooledEmailBackend'
 EMAIL_HOST = env('EMAIL_HOST')
 EMAIL_PORT = env('EMAIL_PORT')
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
@@ -58,6 +77,11 @@ LOGGING = {
             'handlers': ['file', 'mail_admins'],
             'level': 'DEBUG',
             'propagate': True
+        },
+        'subscription_manager': {
+            'handlers': ['file', 'mail_admins'],
+            'level': 'INFO',
+            'propagate': True
         }
     }
 }
@@ -5,7 +5,10 @@ from django.utils.safestring import mark_safe
 from import_export import resources
 from import_export.admin import ExportMixin
 
-from .models import Period, Plan, Subscription
+from subscription_manager.utils.pagination import CachedCountPaginator
+
+from .forms import EligibleEmailDomainForm
+from .models import EligibleEmailDomain, Period, Plan, Subscription
 from .tasks import send_expiration_emails
 
 
@@ -22,14 +25,22 @@ class ActiveSubscriptionResource(SubscriptionResource):
     """
     Defines the data resource for active subscriptions which can be exported.
     """
-    def export(self, queryset=None, *args, **kwargs):
+    def get_queryset(self):
         """
         Only export active subscriptions.
         """
-        if queryset is None:
-            queryset = Subscription.objects.filter(is_active=True)
+        return Subscription.objects.filter(status__is_active=True).order_by('pk')
 
-        return super().export(queryset, *args, **kwargs)
+    def iter_rows(self, chunk_size=2000):
+        """
+        Yields the exported values of all active subscriptions row by row.
+        Only the exported columns are fetched and the rows are read in chunks
+        using a server-side cursor, such that memory usage stays constant.
+        """
+        fields = [field.attribute for field in self.get_export_fields()]
+        rows = self.get_queryset().values_list(*fields)
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield ['' if value is None else value for value in row]
 
 
 class IsActiveListFilter(admin.SimpleListFilter):
@@ -54,9 +65,9 @@ class IsActiveListFilter(admin.SimpleListFilter):
         Filter queryset based on set filter value.
         """
         if self.value() == 'active':
-            queryset = queryset.filter(is_active=True)
+            queryset = queryset.filter(status__is_active=True)
         elif self.value() == 'inactive':
-            queryset = queryset.filter(is_active=False)
+            queryset = queryset.filter(status__is_active=False)
         return queryset
 
 
@@ -82,9 +93,9 @@ class IsPaidListFilter(admin.SimpleListFilter):
         Filter queryset based on set filter value.
         """
         if self.value() == 'paid':
-            queryset = queryset.filter(is_paid=True)
+            queryset = queryset.filter(status__is_paid=True)
         elif self.value() == 'unpaid':
-            queryset = queryset.filter(is_paid=False)
+            queryset = queryset.filter(status__is_paid=False)
         return queryset
 
 
@@ -123,10 +134,13 @@ class SubscriptionAdmin(ExportMixin, admin.ModelAdmin):
     resource_class = SubscriptionResource
     inlines = [PeriodInline]
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('user')
+    list_select_related = ['user', 'plan', 'status']
+    paginator = CachedCountPaginator
+    show_full_result_count = False
 
     def account_name_field(self, obj):
+        if obj.user is None:
+            return ''
         return obj.user.full_name()
     account_name_field.short_description = 'Name (Account)'
 
@@ -134,42 +148,58 @@ class SubscriptionAdmin(ExportMixin, admin.ModelAdmin):
         return obj.full_name()
     address_name_field.short_description = 'Name (Adresse)'
 
+    def status_field(self, obj, name):
+        """
+        Returns a value of the subscription's denormalized status, which is
+        joined to the changelist's query, or None if it does not exist.
+        """
+        return getattr(getattr(obj, 'status', None), name, None)
+
     def is_canceled_field(self, obj):
-        return obj.is_canceled
+        return self.status_field(obj, 'is_canceled')
     is_canceled_field.short_description = 'Gekündigt'
-    is_canceled_field.admin_order_field = 'is_canceled'
+    is_canceled_field.admin_order_field = 'status__is_canceled'
     is_canceled_field.boolean = True
 
     def is_active_field(self, obj):
-        return obj.is_active
+        return self.status_field(obj, 'is_active')
     is_active_field.short_description = 'Ist aktiv'
-    is_active_field.admin_order_field = 'is_active'
+    is_active_field.admin_order_field = 'status__is_active'
     is_active_field.boolean = True
 
     def is_paid_field(self, obj):
-        return obj.is_paid
+        return self.status_field(obj, 'is_paid')
     is_paid_field.short_description = 'Ist bezahlt'
-    is_paid_field.admin_order_field = 'is_paid'
+    is_paid_field.admin_order_field = 'status__is_paid'
     is_paid_field.boolean = True
 
     def start_date_field(self, obj):
-        return obj.start_date
+        return self.status_field(obj, 'start_date')
     start_date_field.short_description = 'Anfangsdatum'
-    start_date_field.admin_order_field = 'start_date'
+    start_date_field.admin_order_field = 'status__start_date'
 
     def end_date_field(self, obj):
-        return obj.end_date
+        return self.status_field(obj, 'end_date')
     end_date_field.short_description = 'Enddatum'
-    end_date_field.admin_order_field = 'end_date'
+    end_date_field.admin_order_field = 'status__end_date'
 
     def send_renewal_notification(self, request, queryset):
-        send_expiration_emails(queryset=queryset)
+        count = send_expiration_emails(queryset=queryset)
+        self.message_user(request, '{} Verlängerungserinnerungen wurden gesendet.'.format(count))
     send_renewal_notification.short_description = 'Verlängerungserinnerung senden'
 
 
+class EligibleEmailDomainInline(admin.TabularInline):
+    model = EligibleEmailDomain
+    form = EligibleEmailDomainForm
+    extra = 0
+    fields = ['domain']
+
+
 @admin.register(Plan)
 class PlanAdmin(admin.ModelAdmin):
     """
     Plan model admin
     """
     list_display = ['name', 'price']
+    inlines = [EligibleEmailDomainInline]
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class SubscriptionConfig(AppConfig):
     name = 'subscription_manager.subscription'
+
+    def ready(self):
+        """
+        Connects the signal receivers which keep the denormalized
+        subscription status up to date.
+        """
+        from . import signals  # noqa: F401
@@ -0,0 +1,129 @@
+from collections import defaultdict
+
+from django.db import models
+from django.utils import timezone
+
+from .managers import reversed_domain_suffixes
+from .models import EligibleEmailDomain, Plan, Subscription
+
+
+class PlanEligibility:
+    """
+    Decides for which plans users are eligible, for the purchase as well as
+    for the renewal of a subscription. The data of all given users is loaded
+    with a fixed number of queries: two for the plans and their email domains,
+    one for the plans whose email domains match the users' verified domains
+    and one for the number of active subscriptions per plan.
+    Afterwards, eligibility is computed without querying the database.
+    """
+    def __init__(self, users=()):
+        users = [user for user in users if user is not None and user.is_authenticated]
+        user_ids = {user.pk for user in users}
+        self.plans = list(Plan.objects.order_by('pk').prefetch_related('email_domains'))
+        self.eligible_plan_ids_cache = dict()
+
+        # Recently verified email domains of each user, which are stored on the user
+        self.verified_email_domains = defaultdict(set)
+        for user in users:
+            self.verified_email_domains[user.pk].update(user.verified_email_domains())
+
+        # Plans whose email domains match the verified domains of each user
+        self.matching_plan_ids = defaultdict(set)
+        all_verified_email_domains = set().union(*self.verified_email_domains.values())
+        if all_verified_email_domains:
+            matching_email_domains = EligibleEmailDomain.objects.matching(
+                all_verified_email_domains
+            ).values_list('plan_id', 'reversed_domain')
+            plan_ids_by_reversed_domain = defaultdict(set)
+            for plan_id, reversed_domain in matching_email_domains:
+                plan_ids_by_reversed_domain[reversed_domain].add(plan_id)
+            for user_id, domains in self.verified_email_domains.items():
+                for domain in domains:
+                    for suffix in reversed_domain_suffixes(domain):
+                        self.matching_plan_ids[user_id] |= plan_ids_by_reversed_domain.get(suffix, set())
+
+        # Number of active, not canceled subscriptions of each user and plan
+        self.active_subscriptions = dict()
+        if user_ids:
+            now = timezone.now().date()
+            counts = Subscription.objects.filter(
+                user_id__in=user_ids,
+                period__end_date__gt=now,
+                period__start_date__lte=now,
+                canceled_at__isnull=True
+            ).values('user_id', 'plan_id').annotate(count=models.Count('id', distinct=True)).order_by()
+            for row in counts:
+                self.active_subscriptions[(row['user_id'], row['plan_id'])] = row['count']
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Returns the eligibility of a single user, which is memoized on the user
+        object. The user object of a request is therefore only evaluated once.
+        """
+        if user is None or not user.is_authenticated:
+            return cls()
+        if not hasattr(user, '_plan_eligibility'):
+            user._plan_eligibility = cls([user])
+        return user._plan_eligibility
+
+    def eligible_plan_ids(self, user, purpose='purchase'):
+        """
+        Returns the set of ids of the plans for which the user is eligible.
+        """
+        user_id = user.pk if user is not None and user.is_authenticated else None
+        key = (user_id, purpose)
+        if key not in self.eligible_plan_ids_cache:
+            self.eligible_plan_ids_cache[key] = {
+                plan.pk for plan in self.plans if self.check(user_id, plan, purpose)
+            }
+        return self.eligible_plan_ids_cache[key]
+
+    def eligible_plans(self, user, purpose='purchase'):
+        """
+        Returns a list of the plans for which the user is eligible.
+        """
+        eligible_plan_ids = self.eligible_plan_ids(user, purpose)
+        return [plan for plan in self.plans if plan.pk in eligible_plan_ids]
+
+    def is_eligible(self, user, plan, purpose='purchase'):
+        """
+        Returns true if the user is eligible for the plan.
+        """
+        return plan.pk in self.eligible_plan_ids(user, purpose)
+
+    def check(self, user_id, plan, purpose):
+        """
+        Checks the plan's conditions for a user id (None for anonymous users).
+        """
+        if purpose == 'purchase' and not plan.is_purchasable:
+            return False
+        if purpose == 'renewal' and not plan.is_renewable:
+            return False
+        if plan.eligible_active_subscriptions_per_user == 0:
+            return False
+
+        # Further checks are only possible for logged in users
+        if user_id is None:
+            return True
+
+        # Check whether the user has reached the maximum amount of active subscriptions
+        if purpose == 'purchase' and plan.eligible_active_subscriptions_per_user is not None:
+            if self.active_subscriptions.get((user_id, plan.pk), 0) >= plan.eligible_active_subscriptions_per_user:
+                return False
+
+        # Check whether one of the user's recently verified email domains (or a parent domain) is eligible
+        if plan.get_eligible_email_domains() and plan.pk not in self.matching_plan_ids[user_id]:
+            return False
+
+        return True
+
+
+def check_eligibility(pairs, purpose='purchase'):
+    """
+    Returns a dictionary which maps each given (user, plan) pair
+    to whether the user is eligible for the plan.
+    """
+    pairs = list(pairs)
+    eligibility = PlanEligibility({user for user, plan in pairs})
+    return {(user, plan): eligibility.is_eligible(user, plan, purpose) for user, plan in pairs}
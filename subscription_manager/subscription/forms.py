@@ -2,7 +2,8 @@
 from django import forms
 
 # Application imports
-from .models import Subscription
+from .managers import normalize_domain
+from .models import EligibleEmailDomain, Subscription
 
 
 class SubscriptionForm(forms.ModelForm):
@@ -23,3 +24,16 @@ class SubscriptionForm(forms.ModelForm):
     class Meta:
         model = Subscription
         fields = ('first_name', 'last_name', 'address_line', 'additional_address_line', 'postcode', 'town', 'country')
+
+
+class EligibleEmailDomainForm(forms.ModelForm):
+    """
+    Eligible email domain form of the plan admin. The domain is
+    normalized before the formset checks it for duplicates.
+    """
+    class Meta:
+        model = EligibleEmailDomain
+        fields = ('domain',)
+
+    def clean_domain(self):
+        return normalize_domain(self.cleaned_data['domain'])
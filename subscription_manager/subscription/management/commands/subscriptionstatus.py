@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from subscription_manager.subscription.models import SubscriptionStatus
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds or verifies the denormalized subscription status table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['rebuild', 'verify'],
+            help='"rebuild" recomputes all rows, "verify" compares them with the live annotations.'
+        )
+
+    def handle(self, *args, **options):
+        if options['action'] == 'rebuild':
+            count = SubscriptionStatus.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS('Rebuilt the status of {} subscriptions.'.format(count)))
+            return
+
+        differences = 0
+        for subscription_id, field, stored, live in SubscriptionStatus.objects.verify():
+            differences += 1
+            if field is None and stored is None:
+                self.stdout.write('Abo #{}: status row is missing'.format(subscription_id))
+            elif field is None:
+                self.stdout.write('Abo #{}: status row has no subscription'.format(subscription_id))
+            else:
+                self.stdout.write('Abo #{}: {} is {}, but should be {}'.format(subscription_id, field, stored, live))
+
+        if differences:
+            raise CommandError('Found {} differences. Run "subscriptionstatus rebuild" to fix them.'.format(differences))
+        self.stdout.write(self.style.SUCCESS('The subscription status table is up to date.'))
@@ -4,11 +4,13 @@ import datetime
 from django.apps import apps
 from django.conf import settings
 from django.core.mail import send_mass_mail
-from django.db import models
+from django.db import models, transaction
 from django.db.models import BooleanField, Case, DateField, IntegerField, Q, Max, Min, Sum, When
 from django.template.loader import render_to_string
 from django.utils import timezone
 
+from subscription_manager.utils.cache import bump_data_version
+
 
 class PlanManager(models.Manager):
 
@@ -16,138 +18,140 @@ class PlanManager(models.Manager):
         """
         Returns plans for which a user is eligible.
         """
-        if purpose == 'purchase':
-            # Filter purchasable plans
-            plans = self.filter(
-                is_purchasable=True
-            ).exclude(
-                eligible_active_subscriptions_per_user=0
-            )
-
-            # If user is logged in, perform additional checks
-            if user is not None and user.is_authenticated:
-
-                # Exclude plans for which the user has reached the maximum allowed amount
-                subscription_model = apps.get_model('subscription', 'Subscription')
-                now = timezone.now().date()
-                plans = plans.exclude(
-                    subscription__in=subscription_model.objects.filter(
-                        user=user,
-                        period__end_date__gt=now,
-                        period__start_date__lte=now,
-                        canceled_at__isnull=True
-                    ).annotate(
-                        num_subs_of_plan=models.Count('plan__id')
-                    ).exclude(
-                        num_subs_of_plan__lt=models.F('plan__eligible_active_subscriptions_per_user')
-                    )
-                )
-
-        elif purpose == 'renewal':
-            # Filter renewable plans
-            plans = self.filter(
-                is_renewable=True
-            ).exclude(
-                eligible_active_subscriptions_per_user=0
-            )
-        else:
+        if purpose not in ['purchase', 'renewal']:
             return None
 
-        # If user is logged in, perform additional checks
-        if user is not None and user.is_authenticated:
+        from .eligibility import PlanEligibility
+        return self.filter(pk__in=PlanEligibility.for_user(user).eligible_plan_ids(user, purpose))
 
-            # Exclude plans for which the user's email domain is not eligible
-            verified_email_domains = user.verified_email_domains()
-            for plan in plans:
-                eligible_email_domains = plan.get_eligible_email_domains()
-                if eligible_email_domains and not any(email in verified_email_domains for email in eligible_email_domains):
-                    plans = plans.exclude(id=plan.id)
 
-        return plans
-
-
-class SubscriptionManager(models.Manager):
-
-    def get_queryset(self):
-        """
-        Annotate queryset with computed fields is_canceled, active_periods_sum,
-        is_active, unpaid_payments_sum, is_paid, start_date, and end_date.
-        """
-        queryset = super().get_queryset()
-        # Annotate queryset with columns is_canceled, active_periods_sum,
-        # is_active, unpaid_payments_sum, is_paid, start_date, and end_date.
-        queryset = queryset.annotate(
-            is_canceled=Case(
+def status_annotations():
+    """
+    Returns the annotations that compute a subscription's status from its periods
+    and payments: is_canceled, active_periods_sum, is_active, unpaid_payments_sum,
+    is_paid, start_date, and end_date.
+    """
+    return dict(
+        is_canceled=Case(
+            When(
+                canceled_at__isnull=False,
+                then=True
+            ),
+            default=False,
+            output_field=BooleanField()
+        ),
+        active_periods_sum=Sum(
+            Case(
                 When(
-                    canceled_at__isnull=False,
-                    then=True
+                    canceled_at__isnull=True,
+                    period__start_date__isnull=False,
+                    period__end_date__isnull=False,
+                    period__start_date__lte=timezone.now().date(),
+                    period__end_date__gt=timezone.now().date(),
+                    period__payment__paid_at__isnull=False,
+                    then=1
                 ),
-                default=False,
-                output_field=BooleanField()
-            ),
-            active_periods_sum=Sum(
-                Case(
-                    When(
-                        canceled_at__isnull=True,
-                        period__start_date__isnull=False,
-                        period__end_date__isnull=False,
-                        period__start_date__lte=timezone.now().date(),
-                        period__end_date__gt=timezone.now().date(),
-                        period__payment__paid_at__isnull=False,
-                        then=1
-                    ),
-                    default=0,
-                    output_field=IntegerField()
-                )
+                default=0,
+                output_field=IntegerField()
+            )
+        ),
+        is_active=Case(
+            When(
+                active_periods_sum__gte=1,
+                then=True
             ),
-            is_active=Case(
+            default=False,
+            output_field=BooleanField()
+        ),
+        unpaid_payments_sum=Sum(
+            Case(
                 When(
-                    active_periods_sum__gte=1,
-                    then=True
+                    period__payment__paid_at__isnull=True,
+                    then=1
                 ),
-                default=False,
-                output_field=BooleanField()
-            ),
-            unpaid_payments_sum=Sum(
-                Case(
-                    When(
-                        period__payment__paid_at__isnull=True,
-                        then=1
-                    ),
-                    default=0,
-                    output_field=IntegerField()
-                )
+                default=0,
+                output_field=IntegerField()
+            )
+        ),
+        is_paid=Case(
+            When(
+                unpaid_payments_sum=0,
+                then=True
             ),
-            is_paid=Case(
+            default=False,
+            output_field=BooleanField()
+        ),
+        start_date=Min(
+            Case(
                 When(
-                    unpaid_payments_sum=0,
-                    then=True
+                    period__payment__paid_at__isnull=False,
+                    then='period__start_date'
                 ),
-                default=False,
-                output_field=BooleanField()
-            ),
-            start_date=Min(
-                Case(
-                    When(
-                        period__payment__paid_at__isnull=False,
-                        then='period__start_date'
-                    ),
-                    default=None,
-                    output_field=DateField()
-                )
-            ),
-            end_date=Max(
-                Case(
-                    When(
-                        period__payment__paid_at__isnull=False,
-                        then='period__end_date'
-                    ),
-                    default=None,
-                    output_field=DateField()
-                )
+                default=None,
+                output_field=DateField()
+            )
+        ),
+        end_date=Max(
+            Case(
+                When(
+                    period__payment__paid_at__isnull=False,
+                    then='period__end_date'
+                ),
+                default=None,
+                output_field=DateField()
             )
         )
-        return queryset
+    )
+
+
+def normalize_domain(domain):
+    """
+    Returns the domain without surrounding whitespace, a leading @ and in
+    lower case, e.g. "uzh.ch" for " @UZH.ch".
+    """
+    return domain.strip().lstrip('@').lower()
+
+
+def reverse_domain(domain):
+    """
+    Returns the domain with its labels in reverse order and a trailing dot,
+    e.g. "ch.uzh." for "uzh.ch". The domains of all subdomains start with it.
+    """
+    return ''.join(label + '.' for label in reversed(domain.lower().split('.')))
+
+
+def reversed_domain_suffixes(domain):
+    """
+    Returns the reversed domains of a domain and all its parent domains,
+    e.g. "ch.", "ch.uzh." and "ch.uzh.student." for "student.uzh.ch".
+    """
+    labels = list(reversed(domain.lower().split('.')))
+    return [''.join(label + '.' for label in labels[:i]) for i in range(1, len(labels) + 1)]
+
+
+class EligibleEmailDomainManager(models.Manager):
+    def matching(self, domains):
+        """
+        Returns all eligible email domains which are equal to or a parent domain of
+        one of the given domains. The lookup uses the reversed domain index.
+        """
+        suffixes = {suffix for domain in domains for suffix in reversed_domain_suffixes(domain)}
+        return self.filter(reversed_domain__in=suffixes)
+
+
+class SubscriptionQuerySet(models.QuerySet):
+
+    def with_status(self):
+        """
+        Annotate queryset with computed fields is_canceled, active_periods_sum,
+        is_active, unpaid_payments_sum, is_paid, start_date, and end_date.
+        Only use it if these fields are needed, as it joins all periods and
+        payments and groups the result by subscription.
+        """
+        return self.annotate(**status_annotations())
+
+
+class SubscriptionManager(models.Manager.from_queryset(SubscriptionQuerySet)):
 
     def get_active_by_month(self, year, month):
         """
@@ -158,7 +162,7 @@ class SubscriptionManager(models.Manager):
         end_day = calendar.monthrange(year, month)[1]
         end_date = datetime.datetime(year, month, end_day).date()
 
-        return self.filter(
+        return self.with_status().filter(
             start_date__lte=end_date,
             end_date__gte=start_date
         )
@@ -167,7 +171,7 @@ class SubscriptionManager(models.Manager):
         """
         Returns all subscriptions that were newly created in the given month.
         """
-        return self.filter(
+        return self.with_status().filter(
             start_date__year=year,
             start_date__month=month
         )
@@ -208,7 +212,7 @@ class SubscriptionManager(models.Manager):
         """
         Returns all subscriptions that expired in the given month.
         """
-        return self.filter(
+        return self.with_status().filter(
             canceled_at__isnull=True,
             end_date__year=year,
             end_date__month=month
@@ -229,10 +233,234 @@ class SubscriptionManager(models.Manager):
         """
         # Get all expiring subscriptions
         end_date = (timezone.now() + timedelta).date()
-        expiring_subscriptions = self.filter(is_canceled=False, end_date=end_date)
+        expiring_subscriptions = self.with_status().filter(is_canceled=False, end_date=end_date)
         return expiring_subscriptions
 
 
+class SubscriptionStatusManager(models.Manager):
+    """
+    Custom manager for the denormalized subscription status.
+    """
+    status_fields = ['is_canceled', 'is_active', 'is_paid', 'start_date', 'end_date']
+    chunk_size = 500
+
+    def compute(self, subscription_ids=None):
+        """
+        Returns the live status of the given subscriptions (or all of them)
+        as dictionaries, computed from the annotations of the subscription manager.
+        """
+        subscription_model = apps.get_model('subscription', 'Subscription')
+        subscriptions = subscription_model.objects.with_status()
+        if subscription_ids is not None:
+            subscriptions = subscriptions.filter(pk__in=subscription_ids)
+        return subscriptions.order_by('pk').values('pk', *self.status_fields)
+
+    def refresh(self, subscription_ids, create=True):
+        """
+        Recomputes the status of the given subscriptions and stores it.
+        Missing status rows are only created if create is true. Returns a
+        list of (old status, new status) tuples of all changed rows. The
+        old status is None if the row did not exist before.
+        """
+        subscription_ids = list(set(subscription_ids))
+        changes = []
+
+        for i in range(0, len(subscription_ids), self.chunk_size):
+            chunk = subscription_ids[i:i + self.chunk_size]
+            existing = {status.pk: status for status in self.filter(pk__in=chunk)}
+
+            for row in self.compute(chunk):
+                old_status = existing.get(row['pk'])
+                new_values = {field: row[field] for field in self.status_fields}
+
+                if old_status is None:
+                    if not create:
+                        continue
+                    new_status = self.create(subscription_id=row['pk'], **new_values)
+                    changes.append((None, new_status))
+                    continue
+
+                if all(getattr(old_status, field) == value for field, value in new_values.items()):
+                    continue
+
+                new_status = self.model(subscription_id=row['pk'], **new_values)
+                new_status.save(force_update=True)
+                changes.append((old_status, new_status))
+
+        return changes
+
+    def refresh_due(self, since=None):
+        """
+        Refreshes the status of all subscriptions with a period that
+        started or ended between the given date and today. Their
+        is_active status depends on the current date and might have
+        changed. The data version is bumped if a status has changed.
+        """
+        period_model = apps.get_model('subscription', 'Period')
+        today = timezone.now().date()
+        if since is None or since > today:
+            since = today
+
+        subscription_ids = period_model.objects.filter(
+            Q(start_date__range=(since, today)) | Q(end_date__range=(since, today))
+        ).values_list('subscription_id', flat=True).distinct()
+
+        changes = self.refresh(subscription_ids)
+        if changes:
+            bump_data_version()
+        return changes
+
+    def rebuild(self):
+        """
+        Deletes all status rows and recomputes them from scratch,
+        then bumps the data version. Returns the number of created rows.
+        """
+        count = 0
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for row in self.compute().iterator(chunk_size=self.chunk_size):
+                batch.append(self.model(subscription_id=row['pk'], **{field: row[field] for field in self.status_fields}))
+                if len(batch) >= self.chunk_size:
+                    count += len(self.bulk_create(batch))
+                    batch = []
+            count += len(self.bulk_create(batch))
+            bump_data_version()
+        return count
+
+    def verify(self):
+        """
+        Compares the stored status rows with the live annotations and
+        yields a (subscription id, field, stored value, live value) tuple
+        for each difference. A missing status row is reported with the
+        field None.
+        """
+        stored = self.order_by('pk').values('pk', *self.status_fields).iterator(chunk_size=self.chunk_size)
+        stored_row = next(stored, None)
+
+        for live_row in self.compute().iterator(chunk_size=self.chunk_size):
+            # Stored rows without a corresponding subscription
+            while stored_row is not None and stored_row['pk'] < live_row['pk']:
+                yield stored_row['pk'], None, stored_row, None
+                stored_row = next(stored, None)
+
+            if stored_row is None or stored_row['pk'] != live_row['pk']:
+                yield live_row['pk'], None, None, live_row
+                continue
+
+            for field in self.status_fields:
+                if stored_row[field] != live_row[field]:
+                    yield live_row['pk'], field, stored_row[field], live_row[field]
+            stored_row = next(stored, None)
+
+
+class ScheduledNotificationManager(models.Manager):
+    """
+    Custom manager for scheduled expiration reminders.
+    """
+    chunk_size = 500
+
+    def schedule(self, subscription_ids, create=True):
+        """
+        Schedules the expiration reminders of the given subscriptions
+        according to their stored status. Unsent reminders which no longer
+        apply, e.g. after a renewal or cancellation, are removed. Reminders
+        whose date has already passed are not created. Sent reminders are
+        kept, such that they are not sent again. New reminders are only
+        created if create is true.
+        """
+        subscription_model = apps.get_model('subscription', 'Subscription')
+        subscription_ids = list(set(subscription_ids))
+        today = timezone.now().date()
+
+        for i in range(0, len(subscription_ids), self.chunk_size):
+            chunk = subscription_ids[i:i + self.chunk_size]
+            end_dates = subscription_model.objects.filter(
+                pk__in=chunk,
+                user__isnull=False,
+                plan__is_renewable=True,
+                status__is_canceled=False,
+                status__end_date__gt=today
+            ).values_list('pk', 'status__end_date')
+            reminders = {
+                (subscription_id, remaining_days, end_date)
+                for subscription_id, end_date in end_dates
+                for remaining_days in settings.EXPIRATION_REMINDER_DAYS
+            }
+
+            # Remove unsent reminders which no longer apply
+            stale = [
+                pk for pk, *reminder in self.filter(subscription_id__in=chunk, sent_at__isnull=True).values_list(
+                    'pk', 'subscription_id', 'remaining_days', 'end_date'
+                ) if tuple(reminder) not in reminders
+            ]
+            if stale:
+                self.filter(pk__in=stale).delete()
+
+            # Create missing reminders, existing ones are skipped by the unique constraint
+            if create:
+                self.bulk_create([
+                    self.model(
+                        subscription_id=subscription_id,
+                        remaining_days=remaining_days,
+                        end_date=end_date,
+                        send_at=timezone.make_aware(datetime.datetime.combine(
+                            end_date - datetime.timedelta(days=remaining_days), datetime.time()
+                        ))
+                    )
+                    for subscription_id, remaining_days, end_date in reminders
+                    if end_date - datetime.timedelta(days=remaining_days) >= today
+                ], ignore_conflicts=True)
+
+    def schedule_upcoming(self):
+        """
+        Schedules the reminders of all subscriptions which end within the
+        reminder period. Changes which did not trigger any signals, e.g.
+        of plans, are thereby picked up as well.
+        """
+        status_model = apps.get_model('subscription', 'SubscriptionStatus')
+        today = timezone.now().date()
+        self.schedule(status_model.objects.filter(
+            end_date__gt=today,
+            end_date__lte=today + datetime.timedelta(days=max(settings.EXPIRATION_REMINDER_DAYS))
+        ).values_list('pk', flat=True))
+
+    def due(self):
+        """
+        Selects unsent reminders whose date has come, including missed
+        ones, unless the subscription has ended in the meantime.
+        """
+        return self.filter(
+            sent_at__isnull=True,
+            send_at__lte=timezone.now(),
+            end_date__gt=timezone.now().date()
+        )
+
+
+class MonthlyStatisticManager(models.Manager):
+    """
+    Custom manager for the monthly statistics rollup.
+    """
+    def mark_stale(self, months):
+        """
+        Marks the given months (first days of the months) as stale
+        and creates rows for months which do not exist yet.
+        """
+        months = set(months)
+        if not months:
+            return
+
+        now = timezone.now()
+        self.filter(month__in=months).update(is_stale=True, changed_at=now)
+        self.bulk_create([self.model(month=month, changed_at=now) for month in months], ignore_conflicts=True)
+
+    def is_populated(self):
+        """
+        Returns true if the statistics have been computed at least once.
+        """
+        return self.filter(computed_at__isnull=False).exists()
+
+
 class PeriodManager(models.Manager):
 
     def get_active(self, subscription=None):
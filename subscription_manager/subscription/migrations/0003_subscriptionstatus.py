@@ -0,0 +1,111 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:16
+
+from django.db import migrations, models
+from django.db.models import BooleanField, Case, DateField, IntegerField, Max, Min, Sum, When
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def status_annotations():
+    """
+    Returns the annotations that compute a subscription's status, as
+    defined when this migration was written. A copy of the manager's
+    annotations, such that later changes do not alter this migration.
+    """
+    today = timezone.now().date()
+    return dict(
+        is_canceled=Case(
+            When(canceled_at__isnull=False, then=True),
+            default=False,
+            output_field=BooleanField()
+        ),
+        active_periods_sum=Sum(
+            Case(
+                When(
+                    canceled_at__isnull=True,
+                    period__start_date__isnull=False,
+                    period__end_date__isnull=False,
+                    period__start_date__lte=today,
+                    period__end_date__gt=today,
+                    period__payment__paid_at__isnull=False,
+                    then=1
+                ),
+                default=0,
+                output_field=IntegerField()
+            )
+        ),
+        is_active=Case(
+            When(active_periods_sum__gte=1, then=True),
+            default=False,
+            output_field=BooleanField()
+        ),
+        unpaid_payments_sum=Sum(
+            Case(
+                When(period__payment__paid_at__isnull=True, then=1),
+                default=0,
+                output_field=IntegerField()
+            )
+        ),
+        is_paid=Case(
+            When(unpaid_payments_sum=0, then=True),
+            default=False,
+            output_field=BooleanField()
+        ),
+        start_date=Min(
+            Case(
+                When(period__payment__paid_at__isnull=False, then='period__start_date'),
+                default=None,
+                output_field=DateField()
+            )
+        ),
+        end_date=Max(
+            Case(
+                When(period__payment__paid_at__isnull=False, then='period__end_date'),
+                default=None,
+                output_field=DateField()
+            )
+        )
+    )
+
+
+def create_subscription_statuses(apps, schema_editor):
+    """
+    Computes the status of all existing subscriptions.
+    """
+    Subscription = apps.get_model('subscription', 'Subscription')
+    SubscriptionStatus = apps.get_model('subscription', 'SubscriptionStatus')
+
+    fields = ['is_canceled', 'is_active', 'is_paid', 'start_date', 'end_date']
+    rows = Subscription.objects.annotate(**status_annotations()).values('pk', *fields)
+    SubscriptionStatus.objects.bulk_create(
+        [SubscriptionStatus(subscription_id=row['pk'], **{field: row[field] for field in fields}) for row in rows],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0002_payment_period'),
+        ('subscription', '0002_auto_20200219_1804'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionStatus',
+            fields=[
+                ('subscription', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status', serialize=False, to='subscription.subscription', verbose_name='Abo')),
+                ('is_canceled', models.BooleanField(default=False, verbose_name='Gekündigt')),
+                ('is_active', models.BooleanField(db_index=True, default=False, verbose_name='Ist aktiv')),
+                ('is_paid', models.BooleanField(db_index=True, default=False, verbose_name='Ist bezahlt')),
+                ('start_date', models.DateField(blank=True, null=True, verbose_name='Anfangsdatum')),
+                ('end_date', models.DateField(blank=True, db_index=True, null=True, verbose_name='Enddatum')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Aktualisiert am')),
+            ],
+            options={
+                'verbose_name': 'Abostatus',
+                'verbose_name_plural': 'Abostatus',
+            },
+        ),
+        migrations.RunPython(create_subscription_statuses, migrations.RunPython.noop),
+    ]
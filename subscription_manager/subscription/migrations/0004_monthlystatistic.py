@@ -0,0 +1,33 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0003_subscriptionstatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStatistic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='Monat')),
+                ('active', models.PositiveIntegerField(default=0, verbose_name='Aktiv')),
+                ('new', models.PositiveIntegerField(default=0, verbose_name='Neu')),
+                ('renewed', models.PositiveIntegerField(default=0, verbose_name='Erneuert')),
+                ('expired', models.PositiveIntegerField(default=0, verbose_name='Abgelaufen')),
+                ('canceled', models.PositiveIntegerField(default=0, verbose_name='Gekündigt')),
+                ('is_stale', models.BooleanField(db_index=True, default=True, verbose_name='Veraltet')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Geändert am')),
+                ('computed_at', models.DateTimeField(blank=True, null=True, verbose_name='Berechnet am')),
+            ],
+            options={
+                'verbose_name': 'Monatsstatistik',
+                'verbose_name_plural': 'Monatsstatistiken',
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def reverse_domain(domain):
+    """
+    Returns the domain with its labels in reverse order and a trailing dot,
+    e.g. "ch.uzh." for "uzh.ch". A copy of the managers' function, such
+    that later changes do not alter this migration.
+    """
+    return ''.join(label + '.' for label in reversed(domain.lower().split('.')))
+
+
+def split_email_domains(apps, schema_editor):
+    """
+    Converts the semicolon separated email domains of all plans into rows.
+    """
+    Plan = apps.get_model('subscription', 'Plan')
+    EligibleEmailDomain = apps.get_model('subscription', 'EligibleEmailDomain')
+
+    email_domains = []
+    for plan in Plan.objects.exclude(eligible_email_domains=''):
+        domains = {domain.strip().lstrip('@').lower() for domain in plan.eligible_email_domains.split(';')}
+        email_domains += [
+            EligibleEmailDomain(plan=plan, domain=domain, reversed_domain=reverse_domain(domain))
+            for domain in sorted(domains) if domain
+        ]
+    EligibleEmailDomain.objects.bulk_create(email_domains)
+
+
+def join_email_domains(apps, schema_editor):
+    """
+    Converts the email domain rows back into semicolon separated strings.
+    """
+    Plan = apps.get_model('subscription', 'Plan')
+    EligibleEmailDomain = apps.get_model('subscription', 'EligibleEmailDomain')
+
+    for plan in Plan.objects.all():
+        domains = EligibleEmailDomain.objects.filter(plan=plan).order_by('pk').values_list('domain', flat=True)
+        plan.eligible_email_domains = ';'.join(domains)
+        plan.save(update_fields=['eligible_email_domains'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0004_monthlystatistic'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EligibleEmailDomain',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(help_text='Adressen von Subdomains sind ebenfalls berechtigt, z.B. student.uzh.ch für uzh.ch.', max_length=253, verbose_name='Domain')),
+                ('reversed_domain', models.CharField(db_index=True, editable=False, max_length=254, verbose_name='Umgekehrte Domain')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_domains', to='subscription.plan', verbose_name='Abotyp')),
+            ],
+            options={
+                'verbose_name': 'Berechtigte E-Mail-Domain',
+                'verbose_name_plural': 'Berechtigte E-Mail-Domains',
+                'unique_together': {('plan', 'domain')},
+            },
+        ),
+        migrations.RunPython(split_email_domains, join_email_domains),
+        migrations.RemoveField(
+            model_name='plan',
+            name='eligible_email_domains',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0005_eligibleemaildomain'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remaining_days', models.PositiveSmallIntegerField(verbose_name='Verbleibende Tage')),
+                ('end_date', models.DateField(verbose_name='Enddatum')),
+                ('send_at', models.DateTimeField(verbose_name='Senden am')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Gesendet am')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_notifications', to='subscription.subscription', verbose_name='Abo')),
+            ],
+            options={
+                'verbose_name': 'Geplante Benachrichtigung',
+                'verbose_name_plural': 'Geplante Benachrichtigungen',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='schedulednotification',
+            index=models.Index(condition=models.Q(sent_at__isnull=True), fields=['send_at'], name='subscription_notification_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='schedulednotification',
+            unique_together={('subscription', 'remaining_days', 'end_date')},
+        ),
+    ]
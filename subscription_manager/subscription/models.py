@@ -2,7 +2,8 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.utils import timezone
 
-from .managers import PlanManager, SubscriptionManager, PeriodManager
+from .managers import PlanManager, SubscriptionManager, SubscriptionStatusManager, PeriodManager, MonthlyStatisticManager, \
+    EligibleEmailDomainManager, ScheduledNotificationManager, normalize_domain, reverse_domain
 
 
 class Plan(models.Model):
@@ -44,12 +45,6 @@ class Plan(models.Model):
         verbose_name='Anzahl aktiver Abos pro Leserin',
         help_text='Kein Wert bedeutet, dass es keine Begrenzung gibt.'
     )
-    eligible_email_domains = models.TextField(
-        blank=True,
-        default='',
-        verbose_name='Berechtigte E-Mail-Domains',
-        help_text='E-Mail-Adressen müssen mit einem Semikolon getrennt sein.'
-    )
     created_at = models.DateTimeField(
         default=timezone.now,
         verbose_name='Erstellt am'
@@ -68,11 +63,7 @@ class Plan(models.Model):
         """
         Returns a list of the eligible email domains.
         """
-        if self.eligible_email_domains is None:
-            return []
-
-        eligible_email_domains_list = self.eligible_email_domains.split(';')
-        return list(filter(None, eligible_email_domains_list))
+        return [email_domain.domain for email_domain in self.email_domains.all()]
 
     def get_readable_eligible_email_domains(self, conjunction='oder'):
         """
@@ -94,12 +85,64 @@ class Plan(models.Model):
         Checks whether a given user is eligible
         to purchase the subscription.
         """
-        if user is not None and self in Plan.objects.filter_eligible(user, purpose):
-            return True
-        return False
+        if user is None:
+            return False
+
+        from .eligibility import PlanEligibility
+        return PlanEligibility.for_user(user).is_eligible(user, self, purpose)
     is_eligible.boolean = True
 
 
+class EligibleEmailDomain(models.Model):
+    """
+    Email domain whose addresses are eligible for a plan. Addresses
+    of subdomains are eligible as well. The domain is also stored with
+    its labels in reverse order, such that a user's domain and its parent
+    domains can be looked up in the index.
+    """
+    plan = models.ForeignKey(
+        to='Plan',
+        on_delete=models.CASCADE,
+        related_name='email_domains',
+        verbose_name='Abotyp'
+    )
+    domain = models.CharField(
+        max_length=253,
+        verbose_name='Domain',
+        help_text='Adressen von Subdomains sind ebenfalls berechtigt, z.B. student.uzh.ch für uzh.ch.'
+    )
+    reversed_domain = models.CharField(
+        max_length=254,
+        db_index=True,
+        editable=False,
+        verbose_name='Umgekehrte Domain'
+    )
+
+    objects = EligibleEmailDomainManager()
+
+    class Meta:
+        verbose_name = 'Berechtigte E-Mail-Domain'
+        verbose_name_plural = 'Berechtigte E-Mail-Domains'
+        unique_together = ['plan', 'domain']
+
+    def __str__(self):
+        return self.domain
+
+    def clean(self):
+        """
+        Normalizes the domain before its uniqueness is validated.
+        """
+        self.domain = normalize_domain(self.domain)
+
+    def save(self, *args, **kwargs):
+        """
+        Normalizes the domain and stores it in reverse order.
+        """
+        self.domain = normalize_domain(self.domain)
+        self.reversed_domain = reverse_domain(self.domain)
+        super().save(*args, **kwargs)
+
+
 class Subscription(models.Model):
     """
     Model that holds the data for a user's subscription (an instance of a plan).
@@ -167,6 +210,16 @@ class Subscription(models.Model):
     def __str__(self):
         return 'Abo #{} ({} {}, {})'.format(self.pk, self.first_name, self.last_name, self.town)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the loaded field values, such that changes
+        can be detected after saving the object.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def full_name(self):
         return '{} {}'.format(self.first_name, self.last_name)
 
@@ -258,6 +311,16 @@ class Period(models.Model):
     def __str__(self):
         return 'Periode #{} ({} bis {})'.format(self.pk, self.start_date, self.end_date)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the loaded field values, such that changes
+        can be detected after saving the object.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def has_started(self):
         """
         True if the period has started.
@@ -280,3 +343,159 @@ class Period(models.Model):
         """
         return self.has_started() and not self.has_ended() and self.payment.is_paid()
     is_active.boolean = True
+
+
+class SubscriptionStatus(models.Model):
+    """
+    Model that holds a denormalized copy of a subscription's computed status.
+    It is kept up to date whenever a subscription, one of its periods or one
+    of their payments changes, such that status filters become simple indexed
+    lookups instead of an aggregate over periods and payments.
+    """
+    subscription = models.OneToOneField(
+        to='Subscription',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='status',
+        verbose_name='Abo'
+    )
+    is_canceled = models.BooleanField(
+        default=False,
+        verbose_name='Gekündigt'
+    )
+    is_active = models.BooleanField(
+        default=False,
+        db_index=True,
+        verbose_name='Ist aktiv'
+    )
+    is_paid = models.BooleanField(
+        default=False,
+        db_index=True,
+        verbose_name='Ist bezahlt'
+    )
+    start_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Anfangsdatum'
+    )
+    end_date = models.DateField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Enddatum'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Aktualisiert am'
+    )
+
+    objects = SubscriptionStatusManager()
+
+    class Meta:
+        verbose_name = 'Abostatus'
+        verbose_name_plural = 'Abostatus'
+
+    def __str__(self):
+        return 'Status von Abo #{}'.format(self.pk)
+
+
+class ScheduledNotification(models.Model):
+    """
+    Expiration reminder of a subscription, which is scheduled when the
+    subscription's status changes and sent by a cron job once its date
+    has come. A reminder refers to an end date, such that a renewed
+    subscription is reminded again.
+    """
+    subscription = models.ForeignKey(
+        to='Subscription',
+        on_delete=models.CASCADE,
+        related_name='scheduled_notifications',
+        verbose_name='Abo'
+    )
+    remaining_days = models.PositiveSmallIntegerField(
+        verbose_name='Verbleibende Tage'
+    )
+    end_date = models.DateField(
+        verbose_name='Enddatum'
+    )
+    send_at = models.DateTimeField(
+        verbose_name='Senden am'
+    )
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Gesendet am'
+    )
+
+    objects = ScheduledNotificationManager()
+
+    class Meta:
+        verbose_name = 'Geplante Benachrichtigung'
+        verbose_name_plural = 'Geplante Benachrichtigungen'
+        unique_together = ['subscription', 'remaining_days', 'end_date']
+        indexes = [
+            # Unsent reminders are scanned by their date
+            models.Index(
+                fields=['send_at'],
+                condition=models.Q(sent_at__isnull=True),
+                name='subscription_notification_idx'
+            )
+        ]
+
+    def __str__(self):
+        return 'Erinnerung für Abo #{} ({} Tage)'.format(self.subscription_id, self.remaining_days)
+
+
+class MonthlyStatistic(models.Model):
+    """
+    Model that holds the precomputed statistics of a month. Months are
+    marked as stale whenever a change affects them and recomputed by a
+    cron job.
+    """
+    month = models.DateField(
+        unique=True,
+        verbose_name='Monat'
+    )
+    active = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Aktiv'
+    )
+    new = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Neu'
+    )
+    renewed = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Erneuert'
+    )
+    expired = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Abgelaufen'
+    )
+    canceled = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Gekündigt'
+    )
+    is_stale = models.BooleanField(
+        default=True,
+        db_index=True,
+        verbose_name='Veraltet'
+    )
+    changed_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Geändert am'
+    )
+    computed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Berechnet am'
+    )
+
+    objects = MonthlyStatisticManager()
+
+    class Meta:
+        verbose_name = 'Monatsstatistik'
+        verbose_name_plural = 'Monatsstatistiken'
+
+    def __str__(self):
+        return 'Statistik {}'.format(self.month.strftime('%Y-%m'))
@@ -0,0 +1,116 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from subscription_manager.utils.cache import bump_data_version
+
+from .models import MonthlyStatistic, Period, ScheduledNotification, Subscription, SubscriptionStatus
+from .statistics import changed_months, month_of
+
+
+def refresh_status(subscription_ids, create=True, months=()):
+    """
+    Refreshes the status of the given subscriptions, reschedules their
+    expiration reminders, marks all months as stale that are affected by
+    the changes, in addition to the given months, and bumps the data version.
+    """
+    months = set(months)
+    for old_status, new_status in SubscriptionStatus.objects.refresh(subscription_ids, create=create):
+        months |= changed_months(old_status, new_status)
+    # No reminders are created while a subscription might be in the process of deletion
+    ScheduledNotification.objects.schedule(subscription_ids, create=create)
+    MonthlyStatistic.objects.mark_stale(months)
+    bump_data_version()
+
+
+def loaded_values(instance, *field_names):
+    """
+    Returns the values of the given fields as they were loaded from the
+    database and remembers the current values for the next save.
+    """
+    previous = getattr(instance, '_loaded_values', {})
+    values = [previous.get(field_name) for field_name in field_names]
+    instance._loaded_values = {field_name: getattr(instance, field_name) for field_name in field_names}
+    return values
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, raw=False, **kwargs):
+    """
+    Creates or refreshes the status of a saved subscription,
+    e.g. after it has been canceled.
+    """
+    # Skip fixtures, the status has to be rebuilt afterwards
+    if raw:
+        return
+
+    # The cancellation month has to be recomputed if it changed
+    months = set()
+    previous_canceled_at, = loaded_values(instance, 'canceled_at')
+    if previous_canceled_at != instance.canceled_at:
+        months = {month_of(date) for date in [previous_canceled_at, instance.canceled_at] if date is not None}
+
+    refresh_status([instance.pk], months=months)
+
+
+@receiver(pre_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """
+    Marks all months as stale to which a subscription contributed before
+    it is deleted, as its status row is deleted along with it.
+    """
+    status = SubscriptionStatus.objects.filter(pk=instance.pk).first()
+    months = changed_months(status, None)
+    if instance.canceled_at is not None:
+        months.add(month_of(instance.canceled_at))
+    MonthlyStatistic.objects.mark_stale(months)
+    bump_data_version()
+
+
+def period_months(period, *dates):
+    """
+    Returns the months of a period's start and end date and of the given
+    dates. These months' renewal counts depend on the period.
+    """
+    return {month_of(date) for date in [period.start_date, period.end_date, *dates] if date is not None}
+
+
+@receiver(post_save, sender=Period)
+def period_saved(sender, instance, raw=False, **kwargs):
+    """
+    Refreshes the subscription status after a period has been created or changed.
+    """
+    if raw:
+        return
+    months = period_months(instance, *loaded_values(instance, 'start_date', 'end_date'))
+    refresh_status([instance.subscription_id], months=months)
+
+
+@receiver(post_delete, sender=Period)
+def period_deleted(sender, instance, **kwargs):
+    """
+    Refreshes the subscription status after a period has been deleted. Status rows
+    are not recreated, as the subscription itself might be in the process of deletion.
+    """
+    refresh_status([instance.subscription_id], create=False, months=period_months(instance))
+
+
+@receiver(post_save, sender='payment.Payment')
+def payment_saved(sender, instance, raw=False, **kwargs):
+    """
+    Refreshes the subscription status after a payment has been created or confirmed.
+    """
+    if raw:
+        return
+    period = Period.objects.filter(pk=instance.period_id).only('subscription_id', 'start_date', 'end_date').first()
+    if period is not None:
+        refresh_status([period.subscription_id], months=period_months(period))
+
+
+@receiver(post_delete, sender='payment.Payment')
+def payment_deleted(sender, instance, **kwargs):
+    """
+    Refreshes the subscription status after a payment has been deleted.
+    """
+    period = Period.objects.filter(pk=instance.period_id).only('subscription_id', 'start_date', 'end_date').first()
+    if period is not None:
+        refresh_status([period.subscription_id], create=False, months=period_months(period))
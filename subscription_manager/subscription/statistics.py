@@ -0,0 +1,245 @@
+import datetime
+
+from django.db import connection, models
+from django.utils import timezone
+
+from subscription_manager.payment.models import Payment
+
+from .models import MonthlyStatistic, Period, Subscription
+
+
+def month_range(start_year, start_month, end_year, end_month):
+    """
+    Returns a list of the first days of all months between the
+    start and the end month (both inclusive).
+    """
+    months = []
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        months.append(datetime.date(year, month, 1))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def next_month(date):
+    """
+    Returns the first day of the month following the given date.
+    """
+    if date.month == 12:
+        return datetime.date(date.year + 1, 1, 1)
+    return datetime.date(date.year, date.month + 1, 1)
+
+
+def month_of(value):
+    """
+    Returns the first day of the month of a date or of an
+    aware datetime in the current time zone.
+    """
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).date()
+    return value.replace(day=1)
+
+
+def status_contributions(status):
+    """
+    Returns a set of (value, month) tuples to which a subscription
+    status contributes, e.g. ('active', month) for each month in which
+    the subscription is active.
+    """
+    contributions = set()
+    if status is None:
+        return contributions
+
+    if status.start_date is not None and status.end_date is not None:
+        months = month_range(status.start_date.year, status.start_date.month, status.end_date.year, status.end_date.month)
+        contributions.update(('active', month) for month in months)
+    if status.start_date is not None:
+        contributions.add(('new', month_of(status.start_date)))
+    if status.end_date is not None and not status.is_canceled:
+        contributions.add(('expired', month_of(status.end_date)))
+    return contributions
+
+
+def changed_months(old_status, new_status):
+    """
+    Returns the months whose statistics are affected by a change
+    of a subscription status. Unchanged months, e.g. of earlier
+    periods of a renewed subscription, are not included.
+    """
+    return {month for value, month in status_contributions(old_status) ^ status_contributions(new_status)}
+
+
+class MonthlyStatistics:
+    """
+    Computes the number of active, new, renewed, expired and canceled
+    subscriptions for a list of months in a single grouped query. The months
+    are joined as a derived table against the subscriptions' aggregated
+    periods, instead of issuing one query per month and value. The values
+    correspond to the subscription manager's get_*_by_month methods.
+    """
+    fields = ['active', 'new', 'renewed', 'expired', 'canceled']
+    # Each month needs five query parameters
+    months_per_query = 100
+
+    def __init__(self, months):
+        self.months = sorted(set(months))
+
+    def compute(self):
+        """
+        Returns a dictionary which maps the first day of each month
+        to a dictionary containing the month's values.
+        """
+        statistics = dict()
+        for i in range(0, len(self.months), self.months_per_query):
+            months = self.months[i:i + self.months_per_query]
+            with connection.cursor() as cursor:
+                cursor.execute(self.get_sql(len(months)), self.get_params(months))
+                for row in cursor.fetchall():
+                    statistics[months[row[0]]] = dict(zip(self.fields, row[1:]))
+        return statistics
+
+    def get_params(self, months):
+        """
+        Returns the query parameters of the months table: the index, the
+        first and last day of each month, and the datetime range in the
+        current time zone in which a cancellation belongs to the month.
+        """
+        params = []
+        for idx, month in enumerate(months):
+            month_end = next_month(month) - datetime.timedelta(days=1)
+            canceled_from = timezone.make_aware(datetime.datetime.combine(month, datetime.time()))
+            canceled_until = timezone.make_aware(datetime.datetime.combine(next_month(month), datetime.time()))
+            params += [
+                idx,
+                connection.ops.adapt_datefield_value(month),
+                connection.ops.adapt_datefield_value(month_end),
+                connection.ops.adapt_datetimefield_value(canceled_from),
+                connection.ops.adapt_datetimefield_value(canceled_until),
+            ]
+        return params
+
+    def get_sql(self, month_count):
+        """
+        Returns the SQL query for the given number of months.
+        """
+        qn = connection.ops.quote_name
+        months = ' UNION ALL '.join(
+            ['SELECT %s AS idx, %s AS month_start, %s AS month_end, %s AS canceled_from, %s AS canceled_until'] +
+            ['SELECT %s, %s, %s, %s, %s'] * (month_count - 1)
+        )
+        return '''
+            WITH months AS ({months}),
+            subscription_status AS (
+                SELECT
+                    s.id,
+                    s.canceled_at,
+                    MIN(CASE WHEN pay.paid_at IS NOT NULL THEN p.start_date END) AS start_date,
+                    MAX(CASE WHEN pay.paid_at IS NOT NULL THEN p.end_date END) AS end_date
+                FROM {subscription} s
+                LEFT JOIN {period} p ON p.subscription_id = s.id
+                LEFT JOIN {payment} pay ON pay.period_id = p.id
+                GROUP BY s.id, s.canceled_at
+            ),
+            paid_periods AS (
+                SELECT p.subscription_id, p.start_date, p.end_date
+                FROM {period} p
+                INNER JOIN {payment} pay ON pay.period_id = p.id
+                WHERE pay.paid_at IS NOT NULL AND p.start_date IS NOT NULL AND p.end_date IS NOT NULL
+            ),
+            renewals AS (
+                SELECT renewed_subscriptions.idx, COUNT(*) AS renewed_count
+                FROM (
+                    SELECT m.idx
+                    FROM months m
+                    INNER JOIN paid_periods pp
+                        ON pp.start_date BETWEEN m.month_start AND m.month_end
+                        OR pp.end_date BETWEEN m.month_start AND m.month_end
+                    GROUP BY m.idx, pp.subscription_id
+                    HAVING COUNT(*) = 2
+                ) renewed_subscriptions
+                GROUP BY renewed_subscriptions.idx
+            )
+            SELECT
+                m.idx,
+                COUNT(CASE WHEN ss.start_date <= m.month_end AND ss.end_date >= m.month_start THEN 1 END),
+                COUNT(CASE WHEN ss.start_date BETWEEN m.month_start AND m.month_end THEN 1 END),
+                COALESCE(r.renewed_count, 0),
+                COUNT(CASE WHEN ss.canceled_at IS NULL AND ss.end_date BETWEEN m.month_start AND m.month_end THEN 1 END),
+                COUNT(CASE WHEN ss.canceled_at >= m.canceled_from AND ss.canceled_at < m.canceled_until THEN 1 END)
+            FROM months m
+            LEFT JOIN subscription_status ss
+                ON (ss.start_date <= m.month_end AND ss.end_date >= m.month_start)
+                OR (ss.canceled_at >= m.canceled_from AND ss.canceled_at < m.canceled_until)
+            LEFT JOIN renewals r ON r.idx = m.idx
+            GROUP BY m.idx, r.renewed_count
+            ORDER BY m.idx
+        '''.format(
+            months=months,
+            subscription=qn(Subscription._meta.db_table),
+            period=qn(Period._meta.db_table),
+            payment=qn(Payment._meta.db_table)
+        )
+
+
+def mark_all_statistics_stale():
+    """
+    Marks all months in which subscription data exists as stale.
+    """
+    bounds = Period.objects.aggregate(first=models.Min('start_date'), last=models.Max('end_date'))
+    canceled_bounds = Subscription.objects.aggregate(first=models.Min('canceled_at'), last=models.Max('canceled_at'))
+
+    first_months = [month_of(date) for date in [bounds['first'], canceled_bounds['first']] if date is not None]
+    last_months = [month_of(date) for date in [bounds['last'], canceled_bounds['last']] if date is not None]
+    if not first_months or not last_months:
+        return
+
+    first_month, last_month = min(first_months), max(last_months)
+    MonthlyStatistic.objects.mark_stale(month_range(first_month.year, first_month.month, last_month.year, last_month.month))
+
+
+def update_stale_statistics(compute=None):
+    """
+    Recomputes all stale months and stores them. Months which are marked
+    as stale again during the computation stay stale. Returns the number
+    of recomputed months. A function that computes the statistics of a
+    list of months can be passed, e.g. for backfilling many months.
+    """
+    if compute is None:
+        compute = lambda months: MonthlyStatistics(months).compute()
+
+    started_at = timezone.now()
+    months = list(MonthlyStatistic.objects.filter(is_stale=True).values_list('month', flat=True))
+
+    for month, values in compute(months).items():
+        MonthlyStatistic.objects.filter(month=month, changed_at__lte=started_at).update(
+            is_stale=False,
+            computed_at=started_at,
+            **values
+        )
+
+    return len(months)
+
+
+def get_statistics(months):
+    """
+    Returns the statistics of the given months like MonthlyStatistics.compute().
+    Stored months are read from the rollup table, stale months are computed on
+    the fly and months without a row are empty. Everything is computed on the
+    fly if the rollup table has not been populated yet.
+    """
+    if not MonthlyStatistic.objects.is_populated():
+        return MonthlyStatistics(months).compute()
+
+    statistics = {month: dict.fromkeys(MonthlyStatistics.fields, 0) for month in months}
+    stale_months = []
+    for row in MonthlyStatistic.objects.filter(month__range=(min(months), max(months))):
+        if row.month not in statistics:
+            continue
+        if row.is_stale:
+            stale_months.append(row.month)
+        else:
+            statistics[row.month] = {field: getattr(row, field) for field in MonthlyStatistics.fields}
+
+    if stale_months:
+        statistics.update(MonthlyStatistics(stale_months).compute())
+    return statistics
@@ -1,56 +1,126 @@
+from collections import defaultdict
+
 from django.conf import settings
-from django.core.mail import send_mass_mail
-from django.template.loader import render_to_string
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import F, Prefetch
 from django.utils import timezone
 
-from subscription_manager.user.models import Token
+from subscription_manager.mail.models import OutgoingEmail
+from subscription_manager.mail.outbox import enqueue_many
+from subscription_manager.mail.rendering import render_emails
+from subscription_manager.user.models import EmailAddress
+from subscription_manager.user.tokens import bulk_create_tokens
 
-from .models import Subscription
+from .models import ScheduledNotification, Subscription
 
 
-def send_expiration_emails(queryset=None, remaining_days=None):
+def send_expiration_emails(queryset=None, remaining_days=None, chunk_size=500):
     """
-    Sends an email to users whose subscriptions expire.
+    Sends an email to users whose subscriptions expire. The subscriptions
+    are processed in chunks: the users and their primary email addresses
+    are loaded with the subscriptions and the login tokens are created in
+    bulk. All emails are rendered at once from the compiled template and
+    queued chunk by chunk. Returns the number of queued emails.
     """
     if remaining_days is None and queryset is None:
-        return
+        return 0
     # Get all expiring subscriptions which are renewable
     if queryset is None:
         queryset = Subscription.objects.get_expiring(timezone.timedelta(days=remaining_days)).filter(plan__is_renewable=True)
 
-    # Loop through subscriptions and send an reminder email to all users
-    messages = []
-    for subscription in queryset:
-        # If subscription is not owned by a user, skip
-        user = subscription.user
-        if user is None:
-            continue
-
-        # Create login token
-        token = Token.objects.create(email_address=user.primary_email(), purpose='login')
-
-        # Add expiration email message
-        if remaining_days is None:
-            subject = settings.EMAIL_SUBJECT_PREFIX + 'Abo verlängern'
-            remaining_days_text = 'bald'
-        elif remaining_days == 1:
-            subject = settings.EMAIL_SUBJECT_PREFIX + 'Abo endet heute'
-            remaining_days_text = 'heute'
-        else:
-            subject = settings.EMAIL_SUBJECT_PREFIX + 'Abo verlängern'
-            remaining_days_text = 'in {} Tagen'.format(remaining_days)
-
-        messages.append((
-            subject,
-            render_to_string('emails/subscription_expiration.txt', {
-                'to_name': user.first_name,
+    # Email subject and text depend on the remaining days
+    if remaining_days is None:
+        subject = settings.EMAIL_SUBJECT_PREFIX + 'Abo verlängern'
+        remaining_days_text = 'bald'
+    elif remaining_days == 1:
+        subject = settings.EMAIL_SUBJECT_PREFIX + 'Abo endet heute'
+        remaining_days_text = 'heute'
+    else:
+        subject = settings.EMAIL_SUBJECT_PREFIX + 'Abo verlängern'
+        remaining_days_text = 'in {} Tagen'.format(remaining_days)
+
+    # Only fetch the ids, such that the queryset's annotations are not repeated for every chunk
+    subscription_ids = list(queryset.filter(user__isnull=False).order_by('pk').values_list('pk', flat=True).distinct())
+
+    recipients, contexts = [], []
+    for i in range(0, len(subscription_ids), chunk_size):
+        subscriptions = Subscription.objects.filter(pk__in=subscription_ids[i:i + chunk_size]).select_related('user').prefetch_related(
+            Prefetch(
+                'user__emailaddress_set',
+                queryset=EmailAddress.objects.filter(is_primary=True),
+                to_attr='primary_email_addresses'
+            )
+        )
+        # Skip users without a primary email address
+        subscriptions = [subscription for subscription in subscriptions if subscription.user.primary_email_addresses]
+
+        # Create login tokens
+        tokens = bulk_create_tokens(
+            [subscription.user.primary_email_addresses[0] for subscription in subscriptions],
+            purpose='login'
+        )
+
+        for subscription, token in zip(subscriptions, tokens):
+            recipients.append(subscription.user.email)
+            contexts.append({
+                'to_name': subscription.user.first_name,
                 'subscription_id': subscription.id,
                 'token': token,
                 'remaining_days': remaining_days_text
-            }),
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email]
-        ))
+            })
+
+    # Render all emails at once from the compiled template
+    bodies = render_emails('emails/subscription_expiration.txt', contexts)
+
+    sent = 0
+    for i in range(0, len(bodies), chunk_size):
+        messages = [
+            EmailMessage(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=[recipient])
+            for recipient, body in zip(recipients[i:i + chunk_size], bodies[i:i + chunk_size])
+        ]
+        # Queue the chunk's emails behind more urgent ones, or send them over one connection
+        sent += enqueue_many(messages, priority=OutgoingEmail.LOW)
+
+    return sent
+
+
+def send_scheduled_notifications(chunk_size=500, shard=0, shards=1):
+    """
+    Sends the expiration reminders which are due, including missed ones.
+    Each chunk of reminders is claimed, queued and marked as sent in one
+    transaction, such that a rerun neither sends a reminder twice nor
+    skips one. Reminders of a subscription which are due at the same
+    time are sent as one email. The reminders can be split by subscription
+    into shards, of which only the given one is sent. Returns the number
+    of queued emails.
+    """
+    today = timezone.now().date()
+    due = ScheduledNotification.objects.due()
+    if shards > 1:
+        due = due.annotate(shard=F('subscription_id') % shards).filter(shard=shard)
+
+    sent = 0
+    while True:
+        with transaction.atomic():
+            notifications = list(
+                due.select_for_update(skip_locked=True).order_by('send_at', 'pk').values_list(
+                    'pk', 'subscription_id', 'end_date'
+                )[:chunk_size]
+            )
+            if not notifications:
+                break
+
+            # The text depends on the actual remaining days, which differ for missed reminders
+            subscription_ids = defaultdict(set)
+            for pk, subscription_id, end_date in notifications:
+                subscription_ids[end_date].add(subscription_id)
+            for end_date, ids in subscription_ids.items():
+                sent += send_expiration_emails(
+                    queryset=Subscription.objects.filter(pk__in=ids),
+                    remaining_days=(end_date - today).days,
+                    chunk_size=chunk_size
+                )
 
-    # Send all expiration emails
-    send_mass_mail(tuple(messages), fail_silently=False)
+            ScheduledNotification.objects.filter(pk__in=[pk for pk, *_ in notifications]).update(sent_at=timezone.now())
+    return sent
@@ -0,0 +1,350 @@
+import datetime
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.forms import inlineformset_factory
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from subscription_manager.payment.models import Payment
+from subscription_manager.user.models import EmailAddress, User
+from subscription_manager.utils.testing import ChangelistQueriesMixin
+
+from .analytics import IntervalEngine, cohort_retention
+from .eligibility import check_eligibility
+from .forms import EligibleEmailDomainForm
+from .models import EligibleEmailDomain, Period, Plan, ScheduledNotification, Subscription
+from .statistics import MonthlyStatistics, month_range
+from .tasks import send_scheduled_notifications
+
+
+def create_subscription(user, plan, periods, paid=True, **fields):
+    """
+    Creates a subscription with a period and a payment for each
+    given (start date, end date) tuple.
+    """
+    subscription = Subscription.objects.create(
+        user=user,
+        plan=plan,
+        first_name='Vorname',
+        last_name='Nachname',
+        address_line='Strasse 1',
+        postcode='8000',
+        town='Zürich',
+        **fields
+    )
+    for start_date, end_date in periods:
+        period = Period.objects.create(subscription=subscription, start_date=start_date, end_date=end_date)
+        Payment.objects.create(period=period, amount=plan.price, paid_at=timezone.now() if paid else None)
+    return subscription
+
+
+class SubscriptionQueryTests(TestCase):
+    """
+    Views which only look up a subscription do not aggregate its
+    periods and payments.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('leserin@example.com', first_name='Vorname', last_name='Nachname')
+        cls.plan = Plan.objects.create(name='Reguläres Abo', slug='regular', price=50)
+        today = timezone.now().date()
+        cls.subscription = create_subscription(
+            cls.user, cls.plan, [(today - datetime.timedelta(days=30), today + datetime.timedelta(days=335))]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_status_annotations_are_opt_in(self):
+        lean = str(Subscription.objects.filter(pk=self.subscription.pk).query)
+        annotated = str(Subscription.objects.with_status().filter(pk=self.subscription.pk).query)
+        self.assertNotIn('GROUP BY', lean)
+        self.assertIn('GROUP BY', annotated)
+
+    def test_lookup_views_do_not_aggregate(self):
+        for name, query_count in [('subscription_update', 3), ('subscription_cancel', 3)]:
+            with self.subTest(name=name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse(name, args=[self.subscription.pk]))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(queries), query_count)
+                for query in queries:
+                    self.assertNotIn('GROUP BY', query['sql'])
+
+
+class MonthlyStatisticsTests(TestCase):
+    """
+    The single query statistics match the per month manager methods.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('leserin@example.com', first_name='Vorname', last_name='Nachname')
+        plan = Plan.objects.create(name='Reguläres Abo', slug='regular', price=50)
+        date = datetime.date
+        # Single year
+        create_subscription(user, plan, [(date(2020, 1, 15), date(2021, 1, 14))])
+        # Renewed within the same month
+        create_subscription(user, plan, [(date(2020, 3, 1), date(2021, 2, 10)), (date(2021, 2, 11), date(2022, 2, 10))])
+        # Renewed in the following month
+        create_subscription(user, plan, [(date(2020, 5, 20), date(2021, 5, 31)), (date(2021, 6, 1), date(2022, 5, 31))])
+        # Canceled
+        create_subscription(
+            user, plan, [(date(2020, 7, 1), date(2021, 6, 30))],
+            canceled_at=timezone.make_aware(datetime.datetime(2020, 11, 3, 12))
+        )
+        # Unpaid
+        create_subscription(user, plan, [(date(2020, 8, 1), date(2021, 7, 31))], paid=False)
+        # Without periods
+        create_subscription(user, plan, [])
+        # With a gap between its periods
+        create_subscription(user, plan, [(date(2020, 2, 1), date(2020, 7, 31)), (date(2020, 10, 1), date(2021, 9, 30))])
+        # With an unpaid renewal
+        subscription = create_subscription(user, plan, [(date(2020, 4, 10), date(2021, 4, 9))])
+        period = Period.objects.create(subscription=subscription, start_date=date(2021, 4, 10), end_date=date(2022, 4, 9))
+        Payment.objects.create(period=period, amount=plan.price)
+        # Canceled after a renewal
+        create_subscription(
+            user, plan, [(date(2020, 9, 1), date(2021, 8, 31)), (date(2021, 9, 1), date(2022, 8, 31))],
+            canceled_at=timezone.make_aware(datetime.datetime(2021, 10, 15, 12))
+        )
+
+    def assert_parity(self, statistics, months):
+        """
+        Compares the statistics of each month with the manager methods.
+        """
+        methods = {
+            'active': Subscription.objects.get_active_by_month,
+            'new': Subscription.objects.get_new_by_month,
+            'renewed': Subscription.objects.get_renewed_by_month,
+            'expired': Subscription.objects.get_expired_by_month,
+            'canceled': Subscription.objects.get_canceled_by_month,
+        }
+        for month in months:
+            for field, method in methods.items():
+                with self.subTest(month=month, field=field):
+                    self.assertEqual(statistics[month][field], method(month.year, month.month).count())
+
+    def test_parity_with_manager_methods(self):
+        months = month_range(2019, 12, 2022, 3)
+        with self.assertNumQueries(1):
+            statistics = MonthlyStatistics(months).compute()
+        self.assertEqual(statistics[datetime.date(2021, 2, 1)]['renewed'], 1)
+        self.assertEqual(statistics[datetime.date(2020, 11, 1)]['canceled'], 1)
+        self.assert_parity(statistics, months)
+
+    def test_interval_engine_parity(self):
+        months = month_range(2019, 12, 2022, 9)
+        with self.assertNumQueries(2):
+            engine = IntervalEngine.load()
+        statistics = engine.compute(months)
+        self.assertEqual(statistics, MonthlyStatistics(months).compute())
+        self.assert_parity(statistics, months)
+        # A single month and a range without data
+        self.assertEqual(engine.compute([datetime.date(2021, 2, 1)]), {datetime.date(2021, 2, 1): statistics[datetime.date(2021, 2, 1)]})
+        self.assertEqual(
+            engine.compute([datetime.date(2010, 1, 1)]),
+            {datetime.date(2010, 1, 1): dict.fromkeys(IntervalEngine.fields, 0)}
+        )
+
+
+class EligibilityTests(TestCase):
+    """
+    Eligibility follows the plans' conditions and is computed with a fixed
+    number of queries, regardless of the number of users and plans.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.regular = Plan.objects.create(name='Reguläres Abo', slug='regular', price=50)
+        cls.student = Plan.objects.create(name='Studierendenabo', slug='student', price=20)
+        EligibleEmailDomain.objects.create(plan=cls.student, domain='ethz.ch')
+        cls.single = Plan.objects.create(name='Probeabo', slug='trial', price=0, eligible_active_subscriptions_per_user=1)
+        cls.closed = Plan.objects.create(name='Altes Abo', slug='old', price=40, is_purchasable=False)
+
+        cls.reader = User.objects.create_user('leser@example.com', first_name='Vorname', last_name='Nachname')
+        cls.student_reader = User.objects.create_user('leserin@example.com', first_name='Vorname', last_name='Nachname')
+        EmailAddress.objects.create(user=cls.student_reader, email='leserin@student.ethz.ch').verify()
+        # Not verified
+        EmailAddress.objects.create(user=cls.reader, email='leser@ethz.ch')
+        today = timezone.now().date()
+        create_subscription(cls.reader, cls.single, [(today, today + datetime.timedelta(days=30))])
+
+    def users(self):
+        return list(User.objects.filter(pk__in=[self.reader.pk, self.student_reader.pk]).order_by('pk'))
+
+    def test_rules(self):
+        reader, student_reader = self.users()
+        pairs = [(user, plan) for user in [reader, student_reader] for plan in Plan.objects.order_by('pk')]
+        eligibility = check_eligibility(pairs)
+        self.assertEqual([plan for (user, plan), eligible in eligibility.items() if eligible and user == reader], [self.regular])
+        self.assertEqual(
+            [plan for (user, plan), eligible in eligibility.items() if eligible and user == student_reader],
+            [self.regular, self.student, self.single]
+        )
+        # Only purchases are limited by active subscriptions
+        self.assertTrue(check_eligibility([(reader, self.single)], 'renewal')[(reader, self.single)])
+
+    def test_query_count(self):
+        pairs = [(user, plan) for user in self.users() for plan in Plan.objects.all()]
+        # Plans, their email domains, matching email domains and active subscriptions
+        with self.assertNumQueries(4):
+            check_eligibility(pairs)
+
+        for i in range(10):
+            user = User.objects.create_user('leserin{}@example.com'.format(i), first_name='Vorname', last_name='Nachname')
+            EmailAddress.objects.create(user=user, email='leserin{}@ethz.ch'.format(i)).verify()
+            plan = Plan.objects.create(name='Abo {}'.format(i), slug='plan-{}'.format(i), price=10)
+            EligibleEmailDomain.objects.create(plan=plan, domain='uzh.ch')
+        pairs = [(user, plan) for user in User.objects.all() for plan in Plan.objects.all()]
+        with self.assertNumQueries(4):
+            eligibility = check_eligibility(pairs)
+        # Regular, student and trial plan for all but the reader with a trial subscription
+        self.assertEqual(sum(eligibility.values()), 1 + 3 + 10 * 3)
+
+    def test_plan_list_view(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('plan_list'))
+            self.assertEqual(response.status_code, 200)
+            return len(queries), response
+
+        self.client.force_login(self.student_reader)
+        few, response = count_queries()
+        self.assertEqual(list(response.context['plans']), [self.regular, self.student, self.single])
+        self.assertEqual(response.context['not_eligible_plans'], [])
+
+        for i in range(10):
+            plan = Plan.objects.create(name='Abo {}'.format(i), slug='plan-{}'.format(i), price=10)
+            EligibleEmailDomain.objects.create(plan=plan, domain='uzh.ch')
+        many, response = count_queries()
+        self.assertEqual(len(response.context['not_eligible_plans']), 10)
+        # Session, user and the eligibility's four queries
+        self.assertEqual((few, many), (6, 6))
+
+
+class EligibleEmailDomainTests(TestCase):
+    """
+    Domains are normalized before their uniqueness is validated and
+    match the addresses of their subdomains.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = Plan.objects.create(name='Studierendenabo', slug='student', price=20)
+        EligibleEmailDomain.objects.create(plan=cls.plan, domain='ethz.ch')
+
+    def test_duplicate_is_a_validation_error(self):
+        with self.assertRaises(ValidationError) as context:
+            EligibleEmailDomain(plan=self.plan, domain=' @ETHZ.ch').full_clean()
+        self.assertIn('__all__', context.exception.message_dict)
+
+    def test_duplicates_within_formset(self):
+        EligibleEmailDomain.objects.all().delete()
+        formset_class = inlineformset_factory(Plan, EligibleEmailDomain, form=EligibleEmailDomainForm, extra=0)
+        formset = formset_class({
+            'email_domains-TOTAL_FORMS': '2',
+            'email_domains-INITIAL_FORMS': '0',
+            'email_domains-0-domain': 'uzh.ch',
+            'email_domains-1-domain': 'UZH.ch',
+        }, instance=self.plan)
+        self.assertFalse(formset.is_valid())
+        self.assertTrue(formset.non_form_errors())
+
+    def test_subdomains_match(self):
+        matching = EligibleEmailDomain.objects.matching
+        self.assertEqual([domain.domain for domain in matching(['student.ethz.ch'])], ['ethz.ch'])
+        self.assertEqual([domain.domain for domain in matching(['ETHZ.ch'])], ['ethz.ch'])
+        self.assertFalse(matching(['notethz.ch']).exists())
+        self.assertFalse(matching(['ethz.ch.example.com']).exists())
+        self.assertFalse(matching(['ch']).exists())
+
+
+class ShardedNotificationTests(TestCase):
+    """
+    Shards split the due reminders by subscription, such that each
+    reminder is sent by exactly one shard.
+    """
+    def test_shards_partition_reminders(self):
+        plan = Plan.objects.create(name='Reguläres Abo', slug='regular', price=50)
+        today = timezone.now().date()
+        end_date = today + datetime.timedelta(days=20)
+        for i in range(10):
+            user = User.objects.create_user('leserin{}@example.com'.format(i), first_name='Vorname', last_name='Nachname')
+            subscription = create_subscription(user, plan, [(end_date - datetime.timedelta(days=365), end_date)])
+            ScheduledNotification.objects.update_or_create(
+                subscription=subscription,
+                remaining_days=30,
+                end_date=end_date,
+                defaults={'send_at': timezone.now() - datetime.timedelta(hours=1)}
+            )
+        due = ScheduledNotification.objects.due().count()
+        self.assertEqual(due, 10)
+
+        sent = [send_scheduled_notifications(shard=shard, shards=3) for shard in range(3)]
+        self.assertEqual(sum(sent), due)
+        self.assertTrue(all(sent))
+        self.assertEqual(len(mail.outbox), due)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), due)
+        self.assertFalse(ScheduledNotification.objects.due().exists())
+
+
+class CohortRetentionTests(TestCase):
+    """
+    Groups subscriptions by the month of their first paid period.
+    """
+    def test_cohorts(self):
+        user = User.objects.create_user('leserin@example.com', first_name='Vorname', last_name='Nachname')
+        plan = Plan.objects.create(name='Reguläres Abo', slug='regular', price=50)
+        date = datetime.date
+        create_subscription(user, plan, [(date(2020, 1, 10), date(2021, 1, 9)), (date(2021, 1, 10), date(2022, 1, 9))])
+        create_subscription(user, plan, [(date(2020, 1, 20), date(2021, 1, 19))])
+        # Unpaid periods do not count
+        create_subscription(user, plan, [(date(2020, 1, 5), date(2021, 1, 4))], paid=False)
+        create_subscription(user, plan, [
+            (date(2020, 3, 1), date(2021, 2, 28)), (date(2021, 3, 1), date(2022, 2, 28)), (date(2022, 3, 1), date(2023, 2, 28))
+        ])
+        create_subscription(user, plan, [(date(2022, 2, 1), date(2023, 1, 31))])
+
+        today = timezone.make_aware(datetime.datetime(2022, 6, 15, 12))
+        with mock.patch('django.utils.timezone.now', return_value=today):
+            cohorts = cohort_retention(chunk_size=2)
+        self.assertEqual(cohorts, [
+            {'month': date(2020, 1, 1), 'size': 2, 'retention': [50, 0]},
+            {'month': date(2020, 3, 1), 'size': 1, 'retention': [100, 100]},
+            # The periods of the youngest cohort have not ended yet
+            {'month': date(2022, 2, 1), 'size': 1, 'retention': [None, None]},
+        ])
+
+        # Outstanding periods are left blank
+        self.client.force_login(User.objects.create_superuser('admin@example.com', 'passwort'))
+        cache.clear()
+        with mock.patch('django.utils.timezone.now', return_value=today):
+            response = self.client.get(reverse('administration_cohorts'))
+        self.assertContains(response, '<td>50&nbsp;%</td>')
+        self.assertContains(response, '<td></td>', count=2)
+
+
+class SubscriptionAdminTests(ChangelistQueriesMixin, TestCase):
+    """
+    The subscription changelist costs the same number of queries
+    regardless of the number of rows on the page: session, user,
+    count, filter choices and rows.
+    """
+    urls = [
+        ('/admin/subscription/subscription/', 5),
+        ('/admin/subscription/subscription/?is_active=active&is_paid=paid&plan__id__exact=1&q=Nachname', 5),
+        ('/admin/subscription/subscription/?o=-7.4', 5),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.plan = Plan.objects.create(pk=1, name='Reguläres Abo', slug='regular', price=50)
+
+    def create_rows(self, user):
+        today = timezone.now().date()
+        create_subscription(user, self.plan, [(today, today + datetime.timedelta(days=365))])
@@ -13,6 +13,7 @@ from django.views.generic import detail, edit, list
 
 from subscription_manager.payment.forms import PaymentForm
 
+from .eligibility import PlanEligibility
 from .forms import SubscriptionForm
 from .models import Subscription, Plan, Period
 
@@ -140,12 +141,18 @@ class PlanListView(list.ListView):
         """
         Returns only plans for which the user is potentially eligible.
         """
-        return Plan.objects.filter_eligible(self.request.user)
+        return PlanEligibility.for_user(self.request.user).eligible_plans(self.request.user)
 
     def get_context_data(self, **kwargs):
+        """
+        Adds purchasable plans for which the user is not eligible to the context.
+        """
         context = super().get_context_data(**kwargs)
-        eligible_plans_pk = Plan.objects.filter_eligible(self.request.user).values('pk')
-        context['not_eligible_plans'] = Plan.objects.filter(is_purchasable=True).exclude(pk__in=eligible_plans_pk)
+        eligibility = PlanEligibility.for_user(self.request.user)
+        eligible_plan_ids = eligibility.eligible_plan_ids(self.request.user)
+        context['not_eligible_plans'] = [
+            plan for plan in eligibility.plans if plan.is_purchasable and plan.pk not in eligible_plan_ids
+        ]
         return context
 
 
@@ -160,7 +167,8 @@ class SubscriptionListView(list.ListView):
     ordering = ['canceled_at', '-created_at']
 
     def get_queryset(self):
-        queryset = Subscription.objects.filter(user=self.request.user).select_related('plan', 'user')
+        # Subscriptions of the related manager share the request's user object and its memoized eligibility
+        queryset = self.request.user.subscription_set.with_status().select_related('plan')
 
         ordering = self.get_ordering()
         if ordering:
@@ -191,7 +199,7 @@ class SubscriptionDetailView(detail.DetailView):
         subscription_id = self.kwargs['subscription_id']
         user = self.request.user
         # Get object or raise 404
-        subscription = get_object_or_404(Subscription.objects.select_related('plan'), id=subscription_id, user=user)
+        subscription = get_object_or_404(Subscription.objects.with_status().select_related('plan'), id=subscription_id, user=user)
         return subscription
 
     def get_context_data(self, **kwargs):
@@ -219,11 +227,9 @@ class SubscriptionUpdateView(edit.UpdateView):
         """
         subscription_id = self.kwargs['subscription_id']
         user = self.request.user
-        # Get object or raise 404
-        subscription = get_object_or_404(Subscription, id=subscription_id, user=user)
-        # Check if subscription is active
-        if not subscription.is_active:
-            raise Http404('Subscription is inactive')
+        # Get active object or raise 404. The stored status is
+        # used, which does not require aggregating all periods.
+        subscription = get_object_or_404(Subscription, id=subscription_id, user=user, status__is_active=True)
         return subscription
 
 
@@ -242,14 +248,15 @@ class SubscriptionCancelView(edit.DeleteView):
         """
         subscription_id = self.kwargs['subscription_id']
         user = self.request.user
-        # Get object or raise 404
-        subscription = get_object_or_404(Subscription, id=subscription_id, user=user)
-        # Check if subscription is active
-        if not subscription.is_active:
-            raise Http404('Subscription is inactive')
-        # Check if subscription is paid
-        if not subscription.is_paid:
-            raise Http404('Subscription is inactive')
+        # Get active and paid object or raise 404. The stored status
+        # is used, which does not require aggregating all periods.
+        subscription = get_object_or_404(
+            Subscription.objects.select_related('plan'),
+            id=subscription_id,
+            user=user,
+            status__is_active=True,
+            status__is_paid=True
+        )
         return subscription
 
     def delete(self, request, *args, **kwargs):
@@ -280,7 +287,7 @@ class PeriodCreateView(View):
 
         # Check if subscription exists
         try:
-            subscription = Subscription.objects.get(id=subscription_id, user=request.user)
+            subscription = Subscription.objects.with_status().select_related('plan', 'user').get(id=subscription_id, user=request.user)
         except Subscription.DoesNotExist:
             raise Http404('Subscription does not exist.')
 
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import ugettext_lazy as _
 
+from subscription_manager.utils.pagination import CachedCountPaginator
+
 from .models import EmailAddress, Token, User
 
 
@@ -25,9 +27,9 @@ class EmailAddressAdmin(admin.ModelAdmin):
     """
     list_display = ['email', 'name_field', 'is_primary']
     search_fields = ['email', 'user__first_name', 'user__last_name']
-
-    def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('user')
+    list_select_related = ['user']
+    paginator = CachedCountPaginator
+    show_full_result_count = False
 
     def name_field(self, obj):
         return obj.user.full_name()
@@ -41,9 +43,9 @@ class TokenAdmin(admin.ModelAdmin):
     """
     list_display = ['email_address', 'name_field', 'purpose', 'code', 'valid_until']
     search_fields = ['code', 'email_address__email', 'email_address__user__first_name', 'email_address__user__last_name']
-
-    def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('email_address', 'email_address__user')
+    list_select_related = ['email_address__user']
+    paginator = CachedCountPaginator
+    show_full_result_count = False
 
     def name_field(self, obj):
         return obj.email_address.user.full_name()
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class UserConfig(AppConfig):
     name = 'subscription_manager.user'
+
+    def ready(self):
+        """
+        Connects the signal receivers which keep the users'
+        verified email domains up to date.
+        """
+        from . import signals  # noqa: F401
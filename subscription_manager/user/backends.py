@@ -1,6 +1,6 @@
 from django.contrib.auth import backends
 
-from .models import Token
+from .tokens import redeem_token
 
 
 class TokenBackend(backends.ModelBackend):
@@ -8,25 +8,24 @@ class TokenBackend(backends.ModelBackend):
     Custom authentication backend that handles
     authentication by token.
     """
-    def authenticate(self, request, code=None, **kwargs):
+    def authenticate(self, request, code=None, token=None, **kwargs):
         """
-        Checks if a given token is valid. If so, the user is returned,
-        otherwise None.
+        Redeems the token of a given code. If it is valid, the user is
+        returned, otherwise None. Instead of the code, a token which has
+        already been redeemed can be passed.
         """
-        # If code is None, authentication fails
-        if code is None:
+        # If neither code nor token is given, authentication fails
+        if code is None and token is None:
             return None
 
-        # Encode code and find it in database
-        try:
-            token = Token.objects.get(code=code)
-            # If token is valid, delete token and return user
-            if token.is_valid():
-                user = token.email_address.user
-                token.delete()
-                if user.is_active:
-                    return user
-        except Token.DoesNotExist:
-            pass
+        # Redeem token by its code
+        if token is None:
+            token = redeem_token(code)
+
+        # If token is valid, return user
+        if token is not None and token.is_valid():
+            user = token.email_address.user
+            if user.is_active:
+                return user
 
         return None
@@ -1,7 +1,6 @@
 from django import forms
-from django.conf import settings
 
-from .models import EmailAddress, User, Token
+from .models import EmailAddress, User, token_rate_limiter
 
 
 class SignUpForm(forms.ModelForm):
@@ -77,7 +76,7 @@ class LoginForm(forms.Form):
             self.add_error(None, 'Der Account ist gesperrt.')
             return False
 
-        if Token.objects.count_created_in_last_hour(user, 'login') >= settings.TOKENS_PER_USER_PER_HOUR:
+        if not token_rate_limiter.is_allowed(user.pk):
             self.add_error(None, 'Du hast die maximale Anzahl an Tokens erreicht. Warte eine Stunde, bevor du es erneut probierst.')
             return False
 
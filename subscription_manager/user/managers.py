@@ -3,6 +3,7 @@ import uuid
 from django.conf import settings
 from django.contrib.auth.models import BaseUserManager
 from django.db import models, IntegrityError
+from django.db.models import F
 from django.utils import timezone
 
 
@@ -60,6 +61,27 @@ class UserManager(BaseUserManager):
         return self._create_user(email, password, **extra_fields)
 
 
+class EmailAddressManager(models.Manager):
+    """
+    Custom manager for email addresses.
+    """
+    def all_abandoned(self):
+        """
+        Selects email addresses which have been added to an account
+        but have not been verified in time and have no tokens left.
+        Primary email addresses are never selected.
+        """
+        from .models import Token
+
+        return self.filter(
+            is_primary=False,
+            verified_at__isnull=True,
+            created_at__lt=timezone.now() - settings.UNVERIFIED_EMAIL_ADDRESS_RETENTION
+        ).exclude(
+            models.Exists(Token.objects.filter(email_address=models.OuterRef('pk')))
+        )
+
+
 class TokenManager(models.Manager):
     """
     Custom manager for tokens.
@@ -85,6 +107,19 @@ class TokenManager(models.Manager):
             token.send(next_page)
         return token is not None
 
+    def bulk_create_for(self, email_addresses, purpose, batch_size=500):
+        """
+        Creates one token for each given email address with as few queries
+        as possible. Unlike create, the quota is not checked, as the tokens
+        are not requested by the users themselves, e.g. for reminder emails.
+        """
+        valid_until = timezone.now() + settings.TOKEN_EXPIRATION
+        tokens = [
+            self.model(email_address=email_address, purpose=purpose, code=uuid.uuid4(), valid_until=valid_until)
+            for email_address in email_addresses
+        ]
+        return self.bulk_create(tokens, batch_size=batch_size)
+
     def filter_valid(self, user, purpose=None):
         """
         Returns all valid tokens for a given user. Furthermore,
@@ -104,26 +139,6 @@ class TokenManager(models.Manager):
             valid_until__gte=timezone.now()
         )
 
-    def count_created_in_last_hour(self, user, purpose=None):
-        """
-        Returns the count of tokens which were created in the
-        last hour. The amount of hours can be specified as a
-        parameter. The count can also be filtered by purpose.
-        """
-        email_addresses = user.emailaddress_set.all()
-        if purpose is None:
-            # Count tokens that are independent from their purpose
-            return self.filter(
-                email_address__in=email_addresses,
-                created_at__gte=timezone.now() - timezone.timedelta(hours=1)
-            ).count()
-        # Count filter with purpose
-        return self.filter(
-            email_address__in=email_addresses,
-            purpose=purpose,
-            created_at__gte=timezone.now() - timezone.timedelta(hours=1)
-        ).count()
-
     def all_expired(self):
         """
         Selects all expired tokens.
@@ -131,3 +146,26 @@ class TokenManager(models.Manager):
         return self.filter(
             valid_until__lt=timezone.now()
         )
+
+
+class RateLimitCounterManager(models.Manager):
+    """
+    Stores the counters of rate limiters in the database, in case the
+    cache is not available. Has the same interface as CacheCounters.
+    """
+    def get_many(self, keys):
+        return dict(self.filter(key__in=keys).values_list('key', 'count'))
+
+    def incr(self, key, timeout):
+        """
+        Increments a counter with an atomic update, after creating it with
+        the given timeout in seconds if it does not exist, and returns its
+        new value.
+        """
+        expires_at = timezone.now() + timezone.timedelta(seconds=timeout)
+        self.bulk_create([self.model(key=key, expires_at=expires_at)], ignore_conflicts=True)
+        self.filter(key=key).update(count=F('count') + 1)
+        return self.get_many([key])[key]
+
+    def decr(self, key):
+        self.filter(key=key).update(count=F('count') - 1)
@@ -0,0 +1,41 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:36
+
+import datetime
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_verified_domains(apps, schema_editor):
+    """
+    Stores the verified domains of all users with verified email addresses.
+    """
+    User = apps.get_model('user', 'User')
+    EmailAddress = apps.get_model('user', 'EmailAddress')
+
+    verified_domains = defaultdict(dict)
+    for user_id, email, verified_at in EmailAddress.objects.filter(verified_at__isnull=False).values_list('user_id', 'email', 'verified_at'):
+        domain = email.split('@')[-1].lower()
+        expires_at = datetime.datetime.combine(
+            verified_at.date() + datetime.timedelta(days=30), datetime.time(), tzinfo=datetime.timezone.utc
+        ).timestamp()
+        verified_domains[user_id][domain] = max(expires_at, verified_domains[user_id].get(domain, expires_at))
+
+    for user_id, domains in verified_domains.items():
+        User.objects.filter(pk=user_id).update(verified_domains=domains)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='verified_domains',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Verifizierte E-Mail-Domains'),
+        ),
+        migrations.RunPython(fill_verified_domains, migrations.RunPython.noop),
+    ]
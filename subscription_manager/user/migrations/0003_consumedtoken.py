@@ -0,0 +1,26 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_user_verified_domains'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumedToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.CharField(editable=False, max_length=64, unique=True, verbose_name='Signatur')),
+                ('valid_until', models.DateTimeField(db_index=True, verbose_name='gültig bis')),
+                ('consumed_at', models.DateTimeField(auto_now_add=True, verbose_name='verwendet am')),
+            ],
+            options={
+                'verbose_name': 'verwendetes Token',
+                'verbose_name_plural': 'verwendete Tokens',
+            },
+        ),
+    ]
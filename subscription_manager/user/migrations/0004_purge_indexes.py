@@ -0,0 +1,22 @@
+# Generated by Django 3.1.1 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_consumedtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='token',
+            name='valid_until',
+            field=models.DateTimeField(db_index=True, verbose_name='gültig bis'),
+        ),
+        migrations.AddIndex(
+            model_name='emailaddress',
+            index=models.Index(condition=models.Q(('is_primary', False), ('verified_at__isnull', True)), fields=['created_at'], name='user_email_unverified_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.1 on 2026-10-17 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_purge_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitCounter',
+            fields=[
+                ('key', models.CharField(max_length=200, primary_key=True, serialize=False, verbose_name='Schlüssel')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Anzahl')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Läuft ab am')),
+            ],
+            options={
+                'verbose_name': 'Zähler',
+                'verbose_name_plural': 'Zähler',
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+import datetime
 import uuid
 
 from django.conf import settings
@@ -5,10 +6,14 @@ from django.contrib.auth.models import AbstractUser
 from django.core.mail import EmailMessage
 from django.db import models, transaction, IntegrityError
 from django.shortcuts import reverse
-from django.template.loader import render_to_string
 from django.utils import timezone
 
-from .managers import UserManager, TokenManager
+from subscription_manager.mail.models import OutgoingEmail
+from subscription_manager.mail.outbox import enqueue
+from subscription_manager.mail.rendering import render_email
+from subscription_manager.utils.ratelimit import RateLimiter
+
+from .managers import UserManager, EmailAddressManager, RateLimitCounterManager, TokenManager
 
 
 class User(AbstractUser):
@@ -33,6 +38,14 @@ class User(AbstractUser):
         unique=True,
         verbose_name='E-Mail-Adresse'
     )
+    # Domains of recently verified email addresses mapped to the
+    # timestamps at which their verification expires
+    verified_domains = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Verifizierte E-Mail-Domains'
+    )
 
     # Substitute username by email address field
     USERNAME_FIELD = 'email'
@@ -51,19 +64,39 @@ class User(AbstractUser):
 
     def verified_email_domains(self):
         """
-        Returns a list of all verified email domain.
+        Returns a list of all recently verified email domains. They
+        are read from the user's verified domains, which are refreshed
+        whenever email addresses are verified, changed or deleted.
         """
-        email_addresses = self.emailaddress_set.filter(verified_at__isnull=False)
-
-        # Exclude email addresses which have not been verified in the last 30 days.
-        exclude_pks = []
-        for email_address in email_addresses:
-            if not email_address.recently_verified(timezone.timedelta(days=30)):
-                exclude_pks.append(email_address.pk)
-        email_addresses = email_addresses.exclude(pk__in=exclude_pks)
+        now = timezone.now().timestamp()
+        return [domain for domain, expires_at in self.verified_domains.items() if expires_at > now]
 
-        email_addresses = map(lambda email: email['email'].split('@')[-1], email_addresses.values('email'))
-        return list(email_addresses)
+    def refresh_verified_domains(self):
+        """
+        Recomputes the verified domains from the user's verified email
+        addresses and stores them. Called whenever an email address is
+        saved or deleted. Expired verifications are dropped.
+        """
+        now = timezone.now().timestamp()
+        verified_domains = dict()
+        for email_address in EmailAddress.objects.filter(user_id=self.pk, verified_at__isnull=False):
+            domain = email_address.email.split('@')[-1].lower()
+            expires_at = email_address.verification_expires_at().timestamp()
+            if expires_at > now:
+                verified_domains[domain] = max(expires_at, verified_domains.get(domain, expires_at))
+
+        self.verified_domains = verified_domains
+        User.objects.filter(pk=self.pk).update(verified_domains=verified_domains)
+
+    def add_verified_domain(self, email_address):
+        """
+        Adds the domain of a newly verified email address to the
+        stored verified domains without reloading the others.
+        """
+        domain = email_address.email.split('@')[-1].lower()
+        expires_at = email_address.verification_expires_at().timestamp()
+        self.verified_domains[domain] = max(expires_at, self.verified_domains.get(domain, expires_at))
+        User.objects.filter(pk=self.pk).update(verified_domains=self.verified_domains)
 
     def full_name(self):
         """
@@ -126,9 +159,19 @@ class EmailAddress(models.Model):
         verbose_name='erstellt am'
     )
 
+    objects = EmailAddressManager()
+
     class Meta:
         verbose_name = 'E-Mail-Adresse'
         verbose_name_plural = 'E-Mail-Adressen'
+        indexes = [
+            # Unverified addresses are purged by their creation date
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(is_primary=False, verified_at__isnull=True),
+                name='user_email_unverified_idx'
+            )
+        ]
 
     def __str__(self):
         return self.email
@@ -150,6 +193,16 @@ class EmailAddress(models.Model):
         return self.verified_at.date() > timezone.now().date() - timedelta
     recently_verified.boolean = True
 
+    def verification_expires_at(self, timedelta=timezone.timedelta(days=30)):
+        """
+        Returns the datetime from which on the email address does not count
+        as recently verified anymore, i.e. the start of the day (UTC) on which
+        recently_verified starts returning false.
+        """
+        if self.verified_at is None:
+            return None
+        return datetime.datetime.combine(self.verified_at.date() + timedelta, datetime.time(), tzinfo=datetime.timezone.utc)
+
     @transaction.atomic
     def set_primary(self):
         """
@@ -163,11 +216,11 @@ class EmailAddress(models.Model):
             if email == self:
                 if not email.is_primary:
                     email.is_primary = True
-                    email.save()
+                    email.save(update_fields=['is_primary'])
             else:
                 if email.is_primary:
                     email.is_primary = False
-                    email.save()
+                    email.save(update_fields=['is_primary'])
 
     def delete(self, using=None, keep_parents=False):
         """
@@ -177,21 +230,95 @@ class EmailAddress(models.Model):
         if self.is_primary:
             raise self.EmailAddressIsPrimaryException
 
-        # Delete email address
+        # Delete email address, which refreshes the user's verified domains
         super().delete(using, keep_parents)
 
     def verify(self):
         """
-        Sets the verified at attribute to the current datetime.
+        Sets the verified at attribute to the current datetime,
+        which refreshes the user's verified domains.
         """
         self.verified_at = timezone.now()
         self.save()
 
+    def verify_once_per_day(self):
+        """
+        Verifies the email address unless it has already been verified
+        today, with a single conditional update. Returns true if the
+        email address has been verified.
+        """
+        now = timezone.now()
+        today = datetime.datetime.combine(now.date(), datetime.time(), tzinfo=datetime.timezone.utc)
+        verified = EmailAddress.objects.filter(
+            models.Q(verified_at__isnull=True) | models.Q(verified_at__lt=today),
+            pk=self.pk
+        ).update(verified_at=now)
+        if not verified:
+            return False
+        self.verified_at = now
+        self.user.add_verified_domain(self)
+        return True
+
     class EmailAddressIsPrimaryException(Exception):
         pass
 
 
-class Token(models.Model):
+class TokenMixin:
+    """
+    Methods shared by tokens stored in the database and signed tokens.
+    Tokens provide an email address, a purpose, a code and a validity.
+    """
+    def url(self):
+        """
+        Returns the url for a given code.
+        Example: https://www.hostname.tld/token/1836af19-67df-4090-8229-16ed13036480/
+        """
+        return '{}{}'.format(
+            settings.BASE_URL,
+            reverse(
+                'token_verification',
+                kwargs={
+                    'code': self.code
+                }
+            )
+        )
+
+    def send(self, next_page=None):
+        """
+        Queues an email with the token code with a high
+        priority and marks the token as sent.
+        """
+        # Select template
+        template = 'emails/token_' + self.purpose + '.txt'
+        subject = self.get_purpose_display()
+
+        # Generate url
+        url = self.url()
+        if next_page is not None:
+            url += '?next=' + next_page
+
+        # Send email
+        email = EmailMessage(
+            subject=settings.EMAIL_SUBJECT_PREFIX + subject,
+            body=render_email(template, {
+                'to_name': self.email_address.user.first_name,
+                'token': self
+            }),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            reply_to=[settings.DEFAULT_REPLY_TO_EMAIL],
+            to=[self.email_address.email]
+        )
+        enqueue(email, priority=OutgoingEmail.HIGH)
+        self.mark_sent()
+
+    def mark_sent(self):
+        """
+        Called after the token has been queued for sending.
+        """
+        pass
+
+
+class Token(TokenMixin, models.Model):
     """
     Tokens are used for login or email verification. It is
     associated with an email address and can be sent to it.
@@ -216,6 +343,7 @@ class Token(models.Model):
         verbose_name='Code'
     )
     valid_until = models.DateTimeField(
+        db_index=True,
         verbose_name='gültig bis'
     )
     sent_at = models.DateTimeField(
@@ -254,7 +382,7 @@ class Token(models.Model):
             user = self.email_address.user
             if user is None:
                 raise ValueError
-            if Token.objects.count_created_in_last_hour(user) >= settings.TOKENS_PER_USER_PER_HOUR:
+            if not token_rate_limiter.hit(user.pk):
                 raise self.TokenQuotaExceededError
 
             # Set valid until
@@ -276,51 +404,19 @@ class Token(models.Model):
         else:
             super().save(force_insert, force_update, using, update_fields)
 
-    def url(self):
+    def mark_sent(self):
         """
-        Returns the url for a given code.
-        Example: https://www.hostname.tld/token/1836af19-67df-4090-8229-16ed13036480/
+        Updates the sent_at field.
         """
-        return '{}{}'.format(
-            settings.BASE_URL,
-            reverse(
-                'token_verification',
-                kwargs={
-                    'code': self.code
-                }
-            )
-        )
+        self.sent_at = timezone.now()
+        self.save()
 
-    def send(self, next_page=None):
+    def consume(self):
         """
-        Sends an email with the token code and updates the
-        sent_at field.
+        Deletes the token, such that it cannot be used again.
+        Returns false if it has already been deleted.
         """
-        # Select template
-        template = 'emails/token_' + self.purpose + '.txt'
-        subject = self.get_purpose_display()
-
-        # Generate url
-        url = self.url()
-        if next_page is not None:
-            url += '?next=' + next_page
-
-        # Send email
-        email = EmailMessage(
-            subject=settings.EMAIL_SUBJECT_PREFIX + subject,
-            body=render_to_string(template, {
-                'to_name': self.email_address.user.first_name,
-                'token': self
-            }),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            reply_to=[settings.DEFAULT_REPLY_TO_EMAIL],
-            to=[self.email_address.email]
-        )
-        email.send(fail_silently=False)
-
-        # Update sent_at field
-        self.sent_at = timezone.now()
-        self.save()
+        return Token.objects.filter(pk=self.pk).delete()[0] > 0
 
     class TokenQuotaExceededError(Exception):
         """
@@ -328,3 +424,71 @@ class Token(models.Model):
         """
         pass
 
+
+class ConsumedToken(models.Model):
+    """
+    Ledger of used signed tokens. Signed tokens are not stored
+    in the database, hence their signature is recorded once
+    they have been used, such that they can only be used once.
+    Entries can be removed once the token has expired.
+    """
+    signature = models.CharField(
+        max_length=64,
+        unique=True,
+        editable=False,
+        verbose_name='Signatur'
+    )
+    valid_until = models.DateTimeField(
+        db_index=True,
+        verbose_name='gültig bis'
+    )
+    consumed_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='verwendet am'
+    )
+
+    class Meta:
+        verbose_name = 'verwendetes Token'
+        verbose_name_plural = 'verwendete Tokens'
+
+    def __str__(self):
+        return self.signature
+
+
+class RateLimitCounter(models.Model):
+    """
+    Number of hits of an identifier within one window of a rate limiter,
+    used if the cache is not available. Counters are deleted by the
+    nightly clean-up once they have expired.
+    """
+    key = models.CharField(
+        max_length=200,
+        primary_key=True,
+        verbose_name='Schlüssel'
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Anzahl'
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name='Läuft ab am'
+    )
+
+    objects = RateLimitCounterManager()
+
+    class Meta:
+        verbose_name = 'Zähler'
+        verbose_name_plural = 'Zähler'
+
+    def __str__(self):
+        return self.key
+
+
+# Limits the number of tokens which can be created per user and hour
+token_rate_limiter = RateLimiter(
+    scope='tokens',
+    limit=settings.TOKENS_PER_USER_PER_HOUR,
+    window=60*60,
+    fallback=RateLimitCounter.objects
+)
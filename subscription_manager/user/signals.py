@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import EmailAddress, User
+
+
+def email_address_user(email_address):
+    """
+    Returns the loaded user of an email address or, if it has not been
+    loaded, e.g. because the user is being deleted, a placeholder with
+    its primary key.
+    """
+    if EmailAddress.user.is_cached(email_address):
+        return email_address.user
+    return User(pk=email_address.user_id)
+
+
+@receiver(post_save, sender=EmailAddress)
+def email_address_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Refreshes the verified domains of the user of a saved email address,
+    e.g. after it has been verified or its verification date has been
+    changed in the admin.
+    """
+    # Skip fixtures and saves which do not change the verification
+    if raw or (update_fields is not None and not {'email', 'verified_at', 'user'} & set(update_fields)):
+        return
+    email_address_user(instance).refresh_verified_domains()
+
+
+@receiver(post_delete, sender=EmailAddress)
+def email_address_deleted(sender, instance, **kwargs):
+    """
+    Refreshes the verified domains of the user of a deleted email address.
+    Deleting a queryset sends the signal for each email address as well.
+    """
+    if instance.verified_at is not None:
+        email_address_user(instance).refresh_verified_domains()
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Reloads the stored verified domains of a user before it is saved.
+    They are only written by refresh_verified_domains() and
+    add_verified_domain(), hence an outdated copy of the user, e.g. in
+    the admin, must not overwrite them.
+    """
+    if raw or instance.pk is None or (update_fields is not None and 'verified_domains' not in update_fields):
+        return
+    verified_domains = User.objects.filter(pk=instance.pk).values_list('verified_domains', flat=True).first()
+    if verified_domains is not None:
+        instance.verified_domains = verified_domains
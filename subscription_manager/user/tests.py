@@ -0,0 +1,179 @@
+import datetime
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from subscription_manager.utils.ratelimit import RateLimiter
+from subscription_manager.utils.testing import ChangelistQueriesMixin
+
+from .models import EmailAddress, RateLimitCounter, Token, User
+from .tokens import create_token, redeem_token
+
+
+class VerifiedDomainsTests(TestCase):
+    """
+    The verified domains stored on the user follow all changes of the
+    user's email addresses.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('leserin@example.com', first_name='Vorname', last_name='Nachname')
+        self.email_address = EmailAddress.objects.create(user=self.user, email='leserin@student.ethz.ch')
+
+    def verified_email_domains(self):
+        return User.objects.get(pk=self.user.pk).verified_email_domains()
+
+    def test_verify(self):
+        self.email_address.verify()
+        self.assertEqual(self.verified_email_domains(), ['student.ethz.ch'])
+
+    def test_change_verification_date(self):
+        self.email_address.verify()
+        self.email_address.verified_at = timezone.now() - datetime.timedelta(days=60)
+        self.email_address.save()
+        self.assertEqual(self.verified_email_domains(), [])
+
+    def test_queryset_delete(self):
+        self.email_address.verify()
+        EmailAddress.objects.filter(pk=self.email_address.pk).delete()
+        self.assertEqual(self.verified_email_domains(), [])
+
+    def test_expiry(self):
+        self.email_address.verified_at = timezone.now() - datetime.timedelta(days=29)
+        self.email_address.save()
+        self.assertEqual(self.verified_email_domains(), ['student.ethz.ch'])
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + datetime.timedelta(days=2)):
+            self.assertEqual(self.verified_email_domains(), [])
+
+    def test_outdated_user_does_not_overwrite(self):
+        outdated_user = User.objects.get(pk=self.user.pk)
+        self.email_address.verify()
+        outdated_user.first_name = 'Neuer Vorname'
+        outdated_user.save()
+        self.assertEqual(self.verified_email_domains(), ['student.ethz.ch'])
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Neuer Vorname')
+
+    def test_save_keeps_its_meaning(self):
+        # Saving a user with a primary key, which does not exist yet, inserts it
+        User(pk=1000, email='leser@example.com', first_name='Vorname', last_name='Nachname').save()
+        User(pk=1001, email='leserin2@example.com', first_name='Vorname', last_name='Nachname').save(force_insert=True)
+        self.assertEqual(User.objects.filter(pk__in=[1000, 1001]).count(), 2)
+
+    def test_set_primary(self):
+        self.email_address.verify()
+        self.email_address.set_primary()
+        self.assertEqual(self.verified_email_domains(), ['student.ethz.ch'])
+        self.assertEqual(User.objects.get(pk=self.user.pk).email, 'leserin@student.ethz.ch')
+
+
+class RateLimiterTests(TestCase):
+    """
+    Counts hits in a sliding window of an hour, in the cache and in the
+    database if the cache is not available.
+    """
+    def setUp(self):
+        cache.clear()
+        self.limiter = RateLimiter(scope='tests', limit=3, window=60*60, fallback=RateLimitCounter.objects)
+        # Start of the next window, cache entries expire relative to the current time
+        self.index = int(time.time() // (60*60)) + 1
+        self.now = self.index * 60 * 60
+
+    def hit(self, seconds=0):
+        with mock.patch('time.time', return_value=self.now + seconds):
+            return self.limiter.hit('user')
+
+    def test_limit(self):
+        with self.assertNumQueries(0):
+            self.assertEqual([self.hit() for i in range(4)], [True, True, True, False])
+        self.assertEqual(cache.get(self.limiter.key('user', self.index)), 3)
+
+    def test_sliding_window(self):
+        for i in range(3):
+            self.hit(seconds=30*60)
+        # Half of the previous window's hits still count
+        self.assertEqual([self.hit(seconds=90*60) for i in range(3)], [True, True, False])
+        self.assertTrue(self.hit(seconds=2*60*60))
+
+    @mock.patch('django.core.cache.cache.get_many', side_effect=ConnectionError)
+    def test_database_fallback(self, get_many):
+        self.assertEqual([self.hit() for i in range(4)], [True, True, True, False])
+        counter = RateLimitCounter.objects.get()
+        self.assertEqual(counter.count, 3)
+        self.assertEqual(counter.key, self.limiter.key('user', self.index))
+        with mock.patch('time.time', return_value=self.now):
+            self.assertFalse(self.limiter.is_allowed('user'))
+
+
+class TokenRedemptionTests(TestCase):
+    """
+    Redeeming a token costs a fixed number of statements: the token is
+    fetched with its email address and user, the email address is verified
+    with a conditional update and the token is consumed.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('leserin@example.com', first_name='Vorname', last_name='Nachname')
+        self.email_address = self.user.primary_email()
+
+    def redeem(self, code):
+        with CaptureQueriesContext(connection) as queries:
+            token = redeem_token(code)
+        # Savepoints of the transactions are not counted
+        return token, [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+
+    def test_signed_token(self):
+        code = create_token(self.email_address, 'login').code
+        token, statements = self.redeem(code)
+        self.assertEqual(token.email_address.user, self.user)
+        # Fetch, consume, verify email address, add verified domain
+        self.assertEqual(len(statements), 4)
+        self.assertIsNone(self.redeem(code)[0])
+
+    @override_settings(TOKEN_MODE='database')
+    def test_database_token(self):
+        code = create_token(self.email_address, 'login').code
+        token, statements = self.redeem(code)
+        self.assertEqual(token.email_address.user, self.user)
+        # Fetch, delete, verify email address, add verified domain
+        self.assertEqual(len(statements), 4)
+        self.assertFalse(Token.objects.exists())
+        self.assertIsNone(self.redeem(code)[0])
+
+    def test_verified_once_per_day(self):
+        redeem_token(create_token(self.email_address, 'login').code)
+        token, statements = self.redeem(create_token(self.email_address, 'login').code)
+        self.assertIsNotNone(token)
+        # Fetch, consume, conditional update without effect
+        self.assertEqual(len(statements), 3)
+
+    def test_login_view(self):
+        code = create_token(self.email_address, 'login').code
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('token_verification', kwargs={'code': code}))
+        # Redemption, creating the session and updating the last login
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 8)
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+
+@override_settings(TOKEN_MODE='database')
+class UserAdminTests(ChangelistQueriesMixin, TestCase):
+    """
+    The email address and token changelists cost the same number of
+    queries regardless of the number of rows on the page: session, user,
+    count and rows with their email addresses and users.
+    """
+    urls = [
+        ('/admin/user/emailaddress/', 4),
+        ('/admin/user/emailaddress/?q=Nachname', 4),
+        ('/admin/user/token/', 4),
+        ('/admin/user/token/?q=Nachname', 4),
+    ]
+
+    def create_rows(self, user):
+        create_token(user.primary_email(), 'login')
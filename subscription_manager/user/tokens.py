@@ -0,0 +1,168 @@
+import datetime
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction, IntegrityError
+from django.utils import baseconv, timezone
+from django.utils.crypto import get_random_string
+
+from .models import ConsumedToken, EmailAddress, Token, TokenMixin, token_rate_limiter
+
+
+class SignedToken(TokenMixin):
+    """
+    Token which is not stored in the database. Its code carries the
+    id of the email address, the purpose, the expiry and a random nonce
+    and is signed with the secret key, hence it can be validated without
+    a lookup. Used tokens are recorded in the ConsumedToken ledger.
+    Example code: 42:login:1kXhB2:Xq3f9a:<signature>
+    """
+    salt = 'subscription_manager.user.tokens.SignedToken'
+    purposes = dict(Token._meta.get_field('purpose').choices)
+
+    def __init__(self, email_address, purpose, valid_until, nonce=None):
+        self.email_address = email_address
+        self.purpose = purpose
+        # Codes carry the expiry in seconds
+        self.valid_until = valid_until.replace(microsecond=0)
+        # Tokens created within the same second must differ
+        self.nonce = get_random_string(6) if nonce is None else nonce
+        self.code = signing.Signer(salt=self.salt).sign('{}:{}:{}:{}'.format(
+            email_address.pk,
+            purpose,
+            baseconv.base62.encode(int(self.valid_until.timestamp())),
+            self.nonce
+        ))
+
+    def __str__(self):
+        return self.code
+
+    @classmethod
+    def from_code(cls, code, lock=False):
+        """
+        Returns the token of a code or None if the signature is invalid or
+        the email address does not exist anymore. Whether the token has
+        already been used is checked when it is consumed. If lock is true,
+        the user's row is locked until the end of the transaction.
+        """
+        try:
+            email_address_id, purpose, valid_until, nonce = signing.Signer(salt=cls.salt).unsign(code).split(':')
+            valid_until = datetime.datetime.fromtimestamp(baseconv.base62.decode(valid_until), tz=datetime.timezone.utc)
+        except (signing.BadSignature, ValueError):
+            return None
+        if purpose not in cls.purposes:
+            return None
+
+        # Get email address and user
+        email_addresses = EmailAddress.objects.select_related('user')
+        if lock:
+            email_addresses = email_addresses.select_for_update(of=('user',))
+        try:
+            email_address = email_addresses.get(pk=email_address_id)
+        except EmailAddress.DoesNotExist:
+            return None
+        return cls(email_address, purpose, valid_until, nonce)
+
+    def signature(self):
+        return self.code.rsplit(':', 1)[1]
+
+    def get_purpose_display(self):
+        return self.purposes[self.purpose]
+
+    def is_valid(self):
+        """
+        True if the token is valid.
+        """
+        return timezone.now() <= self.valid_until
+
+    def consume(self):
+        """
+        Records the token as used. Returns false if it has already been used.
+        """
+        try:
+            with transaction.atomic():
+                ConsumedToken.objects.create(signature=self.signature(), valid_until=self.valid_until)
+        except IntegrityError:
+            return False
+        return True
+
+
+def create_token(email_address, purpose):
+    """
+    Creates a token for an email address, in the database or signed
+    depending on the TOKEN_MODE setting. Returns None if the token
+    quota of the user has been exceeded.
+    """
+    if settings.TOKEN_MODE == 'database':
+        return Token.objects.create(email_address=email_address, purpose=purpose)
+
+    # Limit token creation
+    user = email_address.user
+    if user is None:
+        raise ValueError
+    if not token_rate_limiter.hit(user.pk):
+        return None
+    return SignedToken(email_address, purpose, timezone.now() + settings.TOKEN_EXPIRATION)
+
+
+def create_and_send_token(email_address, purpose, next_page=None):
+    """
+    Creates and sends a token. Returns false if the token
+    quota of the user has been exceeded.
+    """
+    token = create_token(email_address, purpose)
+    if token is not None:
+        token.send(next_page)
+    return token is not None
+
+
+def bulk_create_tokens(email_addresses, purpose):
+    """
+    Creates one token for each given email address without checking
+    the quota, e.g. for reminder emails. Signed tokens are created
+    without querying the database.
+    """
+    if settings.TOKEN_MODE == 'database':
+        return Token.objects.bulk_create_for(email_addresses, purpose)
+    valid_until = timezone.now() + settings.TOKEN_EXPIRATION
+    return [SignedToken(email_address, purpose, valid_until) for email_address in email_addresses]
+
+
+def get_token(code, lock=False):
+    """
+    Returns the token of a code with its email address and user or None
+    if the code is invalid. Codes of tokens in the database (uuids) and
+    signed codes are both accepted, such that links remain valid when the
+    token mode is changed. If lock is true, the token's and the user's
+    rows are locked until the end of the transaction.
+    """
+    try:
+        code = uuid.UUID(str(code))
+    except ValueError:
+        return SignedToken.from_code(str(code), lock)
+    tokens = Token.objects.select_related('email_address__user')
+    if lock:
+        tokens = tokens.select_for_update(of=('self', 'email_address__user'))
+    try:
+        return tokens.get(code=code)
+    except Token.DoesNotExist:
+        return None
+
+
+@transaction.atomic
+def redeem_token(code):
+    """
+    Redeems a token in a single transaction: the token is fetched with
+    its email address and user and locked, the email address is verified
+    unless it has been verified today and the token is consumed.
+    Returns the token or None if the code is invalid or has already been
+    used. Expired tokens are returned without being redeemed.
+    """
+    token = get_token(code, lock=True)
+    if token is None or not token.is_valid():
+        return token
+    if not token.consume():
+        return None
+    token.email_address.verify_once_per_day()
+    return token
@@ -9,7 +9,7 @@ from .views import signup_view, login_view, logout_view, token_verification_view
 urlpatterns = [
     path('registrieren/', signup_view, name='signup'),
     path('anmelden/', login_view, name='login'),
-    path('token/<uuid:code>/', token_verification_view, name='token_verification'),
+    path('token/<str:code>/', token_verification_view, name='token_verification'),
     path('abmelden/', logout_view, name='logout'),
     path('konto/email/', EmailAddressListView.as_view(), name='email_address_list'),
     path('konto/email/hinzufügen/', EmailAddressCreateView.as_view(), name='email_address_create'),
@@ -11,7 +11,8 @@ from django.utils import timezone
 
 from subscription_manager.subscription.models import Plan
 
-from .models import EmailAddress, Token, User
+from .models import EmailAddress, User
+from .tokens import create_and_send_token, redeem_token
 from .forms import SignUpForm, LoginForm
 from .decorators import anonymous_required
 
@@ -39,7 +40,7 @@ def signup_view(request):
             if user is not None:
                 # Create and send verification token
                 # Token quota can not be reached as the email address cannot already exist
-                success = Token.objects.create_and_send(email_address=user.primary_email(), purpose='signup', next_page=next_page)
+                success = create_and_send_token(email_address=user.primary_email(), purpose='signup', next_page=next_page)
                 # Create success message
                 messages.success(request, 'Wir haben dir eine E-Mail an {} geschickt, um deine E-Mail-Adresse zu verfizieren.'.format(user.primary_email()))
                 # Redirect to this page
@@ -83,7 +84,7 @@ def login_view(request):
             # If user exists
             if user is not None:
                 # Create and send token
-                success = Token.objects.create_and_send(email_address=user.primary_email(), purpose='login', next_page=next_page)
+                success = create_and_send_token(email_address=user.primary_email(), purpose='login', next_page=next_page)
                 if success:
                     # Create success message
                     messages.success(request, 'Wir haben dir einen Anmeldelink per E-Mail an {} geschickt.'.format(user.email))
@@ -102,10 +103,9 @@ def token_verification_view(request, code):
     """
     Checks tokens and performs corresponding action.
     """
-    # Get token
-    try:
-        token = Token.objects.get(code=code)
-    except Token.DoesNotExist:
+    # Redeem token, which verifies the email address
+    token = redeem_token(code)
+    if token is None:
         messages.error(request, 'Der Link ist ungültig.')
         return redirect('login')
 
@@ -116,11 +116,8 @@ def token_verification_view(request, code):
 
     # Do login
     if token.purpose == 'login':
-        # Verify email if it has not been verified already
-        if not token.email_address.recently_verified(timezone.timedelta(days=1)):
-            token.email_address.verify()
         # Get user
-        user = authenticate(request, code=code)
+        user = authenticate(request, token=token)
         # If authentication is successful, log user in
         if user is not None:
             login(request, user)
@@ -134,11 +131,8 @@ def token_verification_view(request, code):
 
     # Do login but add different success message
     elif token.purpose == 'signup':
-        # Verify email if it has not been verified already
-        if not token.email_address.recently_verified(timezone.timedelta(days=1)):
-            token.email_address.verify()
         # Get user
-        user = authenticate(request, code=code)
+        user = authenticate(request, token=token)
         # If authentication is successful, log user in
         if user is not None:
             login(request, user)
@@ -152,9 +146,6 @@ def token_verification_view(request, code):
 
     # Do email verification
     elif token.purpose == 'verification':
-        if not token.email_address.recently_verified(timezone.timedelta(days=1)):
-            token.email_address.verify()
-        token.delete()
         messages.success(request, 'Die E-Mail-Adresse {} wurde verifiziert.'.format(token.email_address.email))
         # Redirect to email address list
         return redirect('email_address_list')
@@ -212,7 +203,7 @@ class EmailAddressCreateView(edit.CreateView):
         Redirects to success url.
         """
         email_address = self.object
-        success = Token.objects.create_and_send(email_address=email_address, purpose='verification')
+        success = create_and_send_token(email_address=email_address, purpose='verification')
         if success:
             messages.success(self.request, 'Wir haben dir eine Nachricht an {} geschickt, um die E-Mail-Adresse zu verifizieren.'.format(email_address.email))
         else:
@@ -266,7 +257,7 @@ def email_send_verification_view(request, email_address_id):
         messages.error(request, 'Die E-Mail-Adresse wurde in den letzten 24 Stunden bereits verifiziert.')
         return redirect('email_address_list')
 
-    success = Token.objects.create_and_send(email_address=email_address, purpose='verification')
+    success = create_and_send_token(email_address=email_address, purpose='verification')
     if success:
         messages.success(request, 'Wir haben dir eine Nachricht an {} geschickt, um die E-Mail-Adresse zu verifizieren.'.format(email_address.email))
     else:
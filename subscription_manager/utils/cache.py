@@ -0,0 +1,73 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+DATA_VERSION_KEY = 'data_version'
+
+
+def get_data_version():
+    """
+    Returns the current data version, which changes whenever subscriptions,
+    periods or payments are written. Cache keys that contain the version
+    are therefore never stale. If the version has been evicted, a new one
+    based on the current time is created, such that old keys are not reused.
+    """
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        cache.add(DATA_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """
+    Increments the data version once the current transaction has been
+    committed. Bumping it earlier would allow concurrent requests to
+    cache uncommitted data under the new version. Backends which
+    increment with get and set, like the database cache, apply the
+    default timeout, hence the version is made persistent again.
+    """
+    def bump():
+        try:
+            cache.incr(DATA_VERSION_KEY)
+            cache.touch(DATA_VERSION_KEY, None)
+        except ValueError:
+            cache.set(DATA_VERSION_KEY, int(time.time() * 1000), None)
+
+    transaction.on_commit(bump)
+
+
+def get_or_compute(key, compute, timeout=None, lock_timeout=60, poll_interval=0.1):
+    """
+    Returns the cached value of the key. On a cache miss, only one caller
+    computes the value and stores it, while concurrent callers for the same
+    key wait for the result instead of computing it themselves. If the
+    computation does not finish within the lock timeout, waiting callers
+    compute the value on their own.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = '{}:lock'.format(key)
+    if cache.add(lock_key, True, lock_timeout):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    # Another caller is computing the value, wait for it
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        # The computation failed or has been abandoned
+        if cache.get(lock_key) is None:
+            break
+
+    return compute()
@@ -0,0 +1,66 @@
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .cache import get_data_version, get_or_compute
+
+
+def estimate_count(queryset):
+    """
+    Returns the planner's estimate of the number of rows in the queryset's
+    table, which PostgreSQL keeps up to date when it vacuums or analyzes the
+    table. Returns None on other databases or if the table has not been
+    analyzed yet.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def cached_count(queryset):
+    """
+    Returns the number of rows of the queryset from the cache. The key
+    contains a hash of the query, such that each combination of filters
+    is counted separately, and the data version, such that counts are
+    recounted after subscriptions, periods or payments have been written.
+    Counts of other models are recounted after COUNT_CACHE_TIMEOUT.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    signature = hashlib.md5('{}:{!r}'.format(sql, params).encode()).hexdigest()
+    key = 'count:{}:{}:{}'.format(queryset.model._meta.label_lower, signature, get_data_version())
+    return get_or_compute(key, queryset.count, timeout=settings.COUNT_CACHE_TIMEOUT.total_seconds())
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator which does not count all rows on every page. Unfiltered
+    lists of large tables are counted with the planner's estimate on
+    PostgreSQL, all other lists are counted once and cached. As the
+    estimate is not exact, the last page might be empty or incomplete.
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        # Unfiltered lists of large tables are estimated
+        if not queryset.query.where:
+            estimate = estimate_count(queryset)
+            if estimate is not None and estimate >= settings.COUNT_ESTIMATE_THRESHOLD:
+                return estimate
+
+        return cached_count(queryset)
@@ -0,0 +1,58 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def purge(queryset, batch_size=None, deadline=None):
+    """
+    Deletes the rows of a queryset in batches of primary key ranges. Each
+    batch is deleted with a single DELETE statement which repeats the
+    queryset's conditions, without loading the rows or sending signals.
+    Related rows are therefore not deleted, the queryset must exclude
+    rows which are still referenced. Stops once the deadline (a value of
+    time.monotonic()) has passed. Returns the number of deleted rows and
+    whether all rows have been deleted.
+    """
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    name = queryset.model._meta.label
+    deleted = 0
+    last_pk = None
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.info('Purging %s stopped after %d rows, the time budget is used up.', name, deleted)
+            return deleted, False
+
+        # Find the primary key range of the next batch
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(batch.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+
+        with transaction.atomic(using=queryset.db):
+            deleted += queryset.filter(pk__gte=pks[0], pk__lte=pks[-1])._raw_delete(queryset.db)
+        last_pk = pks[-1]
+        logger.info('Purged %d rows of %s.', deleted, name)
+
+    logger.info('Purging %s finished, %d rows deleted.', name, deleted)
+    return deleted, True
+
+
+def purge_all(querysets, time_budget=None):
+    """
+    Purges the given querysets one after another within a time budget,
+    which is shared by all of them. Returns the number of deleted rows
+    per model label and whether all rows have been deleted.
+    """
+    time_budget = time_budget or settings.PURGE_TIME_BUDGET
+    deadline = time.monotonic() + time_budget.total_seconds()
+    counts = dict()
+    for queryset in querysets:
+        counts[queryset.model._meta.label], complete = purge(queryset, deadline=deadline)
+        if not complete:
+            logger.warning('Purging stopped, the remaining rows will be deleted in the next run.')
+            return counts, False
+    return counts, True
@@ -0,0 +1,131 @@
+import functools
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+class CacheCounters:
+    """
+    Counters stored in the cache. A counter is created with cache.add()
+    and incremented with cache.incr(), which are atomic on memcached and
+    redis. The database cache's incr() resets the expiry to its default
+    timeout, which therefore has to exceed two windows.
+    """
+    def get_many(self, keys):
+        return cache.get_many(keys)
+
+    def incr(self, key, timeout):
+        """
+        Increments a counter, which is created with the given timeout
+        if it does not exist, and returns its new value.
+        """
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+    def decr(self, key):
+        cache.decr(key)
+
+
+class RateLimiter:
+    """
+    Sliding window rate limiter backed by the cache. The hits of each
+    identifier (e.g. a user id) are counted in fixed windows. The hits of
+    the previous window are weighted by how much of it still overlaps with
+    the sliding window, such that two counters approximate a true sliding
+    window. If the cache is not available, the counters are kept in an
+    optional fallback with the same interface as CacheCounters (e.g. a
+    database table) instead.
+    """
+    counters = CacheCounters()
+
+    def __init__(self, scope, limit, window, fallback=None):
+        """
+        Takes the scope of the counters' keys, the maximum number of hits
+        per window, the window's length in seconds and the fallback counters.
+        """
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+        self.fallback = fallback
+
+    def key(self, identifier, index):
+        return 'ratelimit:{}:{}:{}'.format(self.scope, identifier, index)
+
+    def usage(self, identifier, now=None, counters=None):
+        """
+        Returns the estimated number of hits within the sliding window.
+        """
+        counters = self.counters if counters is None else counters
+        now = time.time() if now is None else now
+        index, offset = divmod(now, self.window)
+        index = int(index)
+        keys = [self.key(identifier, index - 1), self.key(identifier, index)]
+        counts = counters.get_many(keys)
+        return counts.get(keys[1], 0) + counts.get(keys[0], 0) * (1 - offset / self.window)
+
+    def is_allowed(self, identifier):
+        """
+        Returns true if the identifier has not reached the limit yet,
+        without counting a hit.
+        """
+        try:
+            return self.usage(identifier) < self.limit
+        except Exception:
+            if self.fallback is None:
+                return True
+            return self.usage(identifier, counters=self.fallback) < self.limit
+
+    def count(self, counters, identifier):
+        """
+        Increments the counter of the current window and returns false,
+        after undoing the increment, if the limit has been exceeded.
+        """
+        index, offset = divmod(time.time(), self.window)
+        index = int(index)
+        previous_key, key = self.key(identifier, index - 1), self.key(identifier, index)
+        previous = counters.get_many([previous_key]).get(previous_key, 0) * (1 - offset / self.window)
+        # The counter has to outlive the following window, in which it is the previous one.
+        # Incrementing first keeps concurrent hits from passing the limit together.
+        if counters.incr(key, 2 * self.window) - 1 + previous >= self.limit:
+            counters.decr(key)
+            return False
+        return True
+
+    def hit(self, identifier):
+        """
+        Counts a hit if the identifier has not reached the limit yet.
+        Returns false if the limit has been reached, true otherwise.
+        """
+        try:
+            return self.count(self.counters, identifier)
+        except Exception:
+            if self.fallback is None:
+                return True
+            return self.count(self.fallback, identifier)
+
+
+def get_client_ip(request):
+    """
+    Returns the client's IP address.
+    """
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def rate_limit(scope, limit, window, key=get_client_ip, methods=('POST',)):
+    """
+    View decorator which limits the number of requests per key (by default
+    the client's IP address). Requests exceeding the limit receive an
+    empty response with status 429.
+    """
+    limiter = RateLimiter(scope, limit, window)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods and not limiter.hit(key(request)):
+                return HttpResponse('Zu viele Anfragen. Versuche es später erneut.', status=429)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
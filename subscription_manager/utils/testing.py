@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from subscription_manager.user.models import User
+
+
+class ChangelistQueriesMixin:
+    """
+    Test case mixin which requests admin changelists with a few and with
+    many rows and checks that they cost the same number of queries.
+    Subclasses list the changelists' urls with their expected number of
+    queries and create the rows of each user in create_rows().
+    """
+    # Pairs of changelist url and expected number of queries
+    urls = []
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin@example.com', 'passwort')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_rows(self, user):
+        raise NotImplementedError
+
+    def create_users(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user('leserin{}@example.com'.format(i), first_name='Vorname', last_name='Nachname')
+            self.create_rows(user)
+
+    def count_queries(self, url):
+        # Counts are cached per data version, which does not change within a test
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # The rows of all users match the filters and the search
+        self.assertGreaterEqual(response.context['cl'].result_count, User.objects.filter(is_superuser=False).count())
+        return len(queries)
+
+    def test_query_count(self):
+        self.create_users(2)
+        few = [self.count_queries(url) for url, _ in self.urls]
+        self.create_users(40)
+        many = [self.count_queries(url) for url, _ in self.urls]
+        self.assertEqual(few, many)
+        self.assertEqual(many, [query_count for _, query_count in self.urls])